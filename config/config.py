@@ -10,6 +10,27 @@ USERS_STORAGE_FILE_NAME = os.getenv("USERS_STORAGE_FILE_NAME", "users.csv")
 USERS_STORAGE_FILE_PATH = os.getenv("USERS_STORAGE_FILE_PATH", os.path.join(BASE_PATH, "assets"))
 CHECKOUT_STORAGE_FILE_NAME = os.getenv("CHECKOUT_STORAGE_FILE_NAME", "checkout.csv")
 CHECKOUT_STORAGE_FILE_PATH = os.getenv("CHECKOUT_STORAGE_FILE_PATH", os.path.join(BASE_PATH, "assets"))
+HISTORY_STORAGE_FILE_NAME = os.getenv("HISTORY_STORAGE_FILE_NAME", "history.csv")
+HISTORY_STORAGE_FILE_PATH = os.getenv("HISTORY_STORAGE_FILE_PATH", os.path.join(BASE_PATH, "assets"))
+HOLDS_STORAGE_FILE_NAME = os.getenv("HOLDS_STORAGE_FILE_NAME", "holds.csv")
+HOLDS_STORAGE_FILE_PATH = os.getenv("HOLDS_STORAGE_FILE_PATH", os.path.join(BASE_PATH, "assets"))
+LOAN_PERIOD_DAYS = int(os.getenv("LOAN_PERIOD_DAYS", 14))
+CHANGELOG_ENABLED = os.getenv("CHANGELOG_ENABLED", "true").lower() == "true"
+CHANGELOG_FILE_PATH = os.getenv("CHANGELOG_FILE_PATH", os.path.join(BASE_PATH, "assets", "changelog.jsonl"))
+REPLICA_MODE = os.getenv("REPLICA_MODE", "false").lower() == "true"
+REPLICA_PRIMARY_PATH = os.getenv("REPLICA_PRIMARY_PATH", os.path.join(BASE_PATH, "primary"))
+REPLICA_CHANGELOG_FILE_PATH = os.getenv("REPLICA_CHANGELOG_FILE_PATH", os.path.join(REPLICA_PRIMARY_PATH, "changelog.jsonl"))
+REPLICA_MAX_STALENESS = float(os.getenv("REPLICA_MAX_STALENESS", 5))
+BOOKS_SHARDS = int(os.getenv("BOOKS_SHARDS", 1))
+USERS_SHARDS = int(os.getenv("USERS_SHARDS", 1))
+CHECKOUT_SHARDS = int(os.getenv("CHECKOUT_SHARDS", 1))
+BOOKS_SNAPSHOT_READS = os.getenv("BOOKS_SNAPSHOT_READS", "false").lower() == "true"
+RECORD_CACHE_SIZE = int(os.getenv("RECORD_CACHE_SIZE", 1024))
+RECORD_CACHE_TTL = float(os.getenv("RECORD_CACHE_TTL", 300))
+BLOOM_FILTER_ENABLED = os.getenv("BLOOM_FILTER_ENABLED", "false").lower() == "true"
+BLOOM_FALSE_POSITIVE_RATE = float(os.getenv("BLOOM_FALSE_POSITIVE_RATE", 0.01))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 100000))
+BACKUP_PATH = os.getenv("BACKUP_PATH", os.path.join(BASE_PATH, "backups"))
 LOGS_FILE_PATH = os.getenv("LOGS_FILE_PATH", os.path.join(BASE_PATH, "logs"))
 
 os.makedirs(BOOKS_STORAGE_FILE_PATH, exist_ok=True)
\ No newline at end of file
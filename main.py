@@ -2,6 +2,11 @@ import sys
 from services.books import BooksDB
 from services.users import UsersDB
 from services.check import CheckoutDB
+from services.context import default_context
+from services.backup import BackupManager
+from services.integrity import IntegrityChecker
+from services.export import Exporter
+from services.changelog import open_changelog
 
 def main_menu():
     print("Hey there! Welcome to the world's first online library Management system! Here you can manage your whole library from adding books to checking them out to your customers! 📚")
@@ -9,6 +14,10 @@ def main_menu():
     print("1. Update Books in the library 📚")
     print("2. Update Users in the library 👤")
     print("3. Update Checkouts in the library 📚👤")
+    print("4. Show memory used by the tables 🧠")
+    print("5. Backup and Restore 💾")
+    print("6. Check data integrity 🩺")
+    print("7. Export data 📤")
     print("-1. I am done for now. Exit the system.")
     choice = input("Enter choice: ")
     return choice
@@ -19,6 +28,12 @@ def books_menu():
     print("3. Delete a Book from the library")
     print("4. Update Book details")
     print("5. Search Book")
+    print("6. Write Catalogue Snapshot")
+    print("7. Validate Books")
+    print("8. Books Report by Author")
+    print("9. Import Books from CSV")
+    print("10. Reshard Books")
+    print("11. Add Books from File or Scanner")
     print("-1. Exit")
     choice = input("Enter choice: ")
     return choice
@@ -29,6 +44,8 @@ def users_menu():
     print("3. Delete a User")
     print("4. Update User details")
     print("5. Search User")
+    print("6. Validate Users")
+    print("7. Import Users from CSV")
     print("-1. Exit")
     choice = input("Enter choice: ")
     return choice
@@ -39,22 +56,52 @@ def checkout_menu():
     print("3. Update Checkout details")
     print("4. Search Checkout")
     print("5. List Checkouts")
+    print("6. List Overdue Loans")
+    print("7. Search Loans by Date Range")
+    print("8. List Loan History")
+    print("9. Place a Hold")
+    print("10. Place a Staff Hold")
+    print("11. List Holds")
+    print("12. Checkout Books from File or Scanner")
+    print("13. Return Books from File or Scanner")
+    print("-1. Exit")
+    choice = input("Enter choice: ")
+    return choice
+
+def backup_menu():
+    print("1. Take a Full Backup")
+    print("2. Take an Incremental Backup")
+    print("3. List Backups")
+    print("4. Restore to a Point in Time")
     print("-1. Exit")
     choice = input("Enter choice: ")
     return choice
 
 def main():
     try:
-        book_management = BooksDB()
-        user_management = UsersDB()
-        checkout_management = CheckoutDB()
+        # one instance per table, shared by every service of the process
+        context = default_context()
+        book_management = context.instance(BooksDB)
+        user_management = context.instance(UsersDB)
+        checkout_management = context.instance(CheckoutDB)
+        tables = {**book_management.table_specs(), **user_management.table_specs(), **checkout_management.table_specs(), **checkout_management.holds_db.table_specs()}
+        backup_management = BackupManager(tables=tables, changelog=open_changelog(context.changelog_file_path), context=context)
+        shards = {**book_management.table_shards(), **user_management.table_shards(), **checkout_management.table_shards()}
+        exporter = Exporter(tables=tables, shards=shards, context=context)
+        integrity_checker = IntegrityChecker(checkout_db=checkout_management)
 
         book_mapping = {
             '1': book_management.add_book,
             '2': book_management.list_books,
             '3': book_management.delete_book,
             '4': book_management.update_book_details,
-            '5': book_management.search_book
+            '5': book_management.search_book,
+            '6': book_management.write_snapshot,
+            '7': book_management.validate_books,
+            '8': book_management.books_report,
+            '9': book_management.import_books,
+            '10': book_management.reshard_books,
+            '11': book_management.add_books
         }
 
         user_mapping = {
@@ -62,7 +109,9 @@ def main():
             '2': user_management.list_users,
             '3': user_management.remove_user,
             '4': user_management.update_user_details,
-            '5': user_management.search_user
+            '5': user_management.search_user,
+            '6': user_management.validate_users,
+            '7': user_management.import_users
         }
 
         checkout_mapping = {
@@ -70,19 +119,42 @@ def main():
             '2': checkout_management.return_book,
             '3': checkout_management.update_checkout,
             '4': checkout_management.search,
-            '5': checkout_management.list_checkouts
+            '5': checkout_management.list_checkouts,
+            '6': checkout_management.overdue_loans,
+            '7': checkout_management.loans_in_range,
+            '8': checkout_management.list_history,
+            '9': checkout_management.place_hold,
+            '10': checkout_management.place_staff_hold,
+            '11': checkout_management.list_holds,
+            '12': checkout_management.checkout_books,
+            '13': checkout_management.return_books
+        }
+
+        backup_mapping = {
+            '1': backup_management.full_backup,
+            '2': backup_management.incremental_backup,
+            '3': backup_management.list_backups,
+            '4': backup_management.restore_backup
         }
 
         choice_mapping = {
             '1': {"menu":books_menu, "mapping":book_mapping},
             '2': {"menu":users_menu, "mapping":user_mapping},
-            '3': {"menu":checkout_menu, "mapping":checkout_mapping}
+            '3': {"menu":checkout_menu, "mapping":checkout_mapping},
+            '5': {"menu":backup_menu, "mapping":backup_mapping}
         }
 
         while True:
             choice = main_menu()
             if choice == '-1':
                 break
+            elif choice == '4':
+                for management in (book_management, user_management, checkout_management):
+                    management.memory_report()
+            elif choice == '6':
+                integrity_checker.fsck()
+            elif choice == '7':
+                exporter.export_table()
             elif choice in choice_mapping:
                 while True:
                     menu, mapping = choice_mapping[choice].values()
@@ -6,6 +6,7 @@ class Book(BaseModel):
     title: Union[str, None]
     author: Union[str, None]
     availability: Union[int, None] = None
+    stock: Union[int, None] = None
 
 class AddBook(BaseModel):
     isbn: int
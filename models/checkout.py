@@ -1,9 +1,23 @@
+from datetime import datetime
 from typing import Union
 from pydantic import BaseModel
 
 class Checkout(BaseModel):
     isbn: int
     user_id: Union[int, None]
+    checkout_time: Union[datetime, None] = None
+    due_date: Union[datetime, None] = None
 
 class Return(BaseModel):
     isbn: int
+
+class LoanHistory(BaseModel):
+    isbn: int
+    user_id: int
+    checkout_time: Union[datetime, None] = None
+    due_date: Union[datetime, None] = None
+    return_time: datetime
+
+class LoanRange(BaseModel):
+    start: datetime
+    end: datetime
@@ -0,0 +1,10 @@
+from datetime import datetime
+from typing import Union
+from pydantic import BaseModel
+
+class Hold(BaseModel):
+    isbn: int
+    user_id: int
+    priority: bool = False
+    requested_at: Union[datetime, None] = None
+    fulfilled_at: Union[datetime, None] = None
@@ -0,0 +1,361 @@
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from services.changelog import ChangeLog
+from services.context import StorageContext, default_context
+from services.replica import Replica
+from services.schema import apply_dtypes
+from services.shards import existing_paths, read_shard, shard_of, shard_paths, write_csv, write_layout
+from config.log import db_logger
+
+class BackupManager():
+    """
+    Online backups of the tables. A full backup hard links (or copies) the table files, which are only
+    ever replaced atomically, and records the change log position before and after, so writers never
+    wait for it. Incremental backups keep the changes since the previous backup. A restore copies back
+    the latest full backup older than the target, replays the logged changes in effect at the target
+    and logs a restore marker superseding the changes it undid, holding the locks of every table.
+    """
+    def __init__(self, tables: Dict[str, Tuple[str, Union[str, None], Dict[str, str]]], changelog: ChangeLog, backup_path: Union[str, None] = None, context: Union[StorageContext, None] = None) -> None:
+        self.context = context or default_context()
+        self.tables = tables
+        self.changelog = changelog
+        self.backup_path = backup_path or self.context.backup_path
+        self.logger = db_logger.getChild("BackupManager")
+
+    def _manifests(self) -> List[dict]:
+        """
+        Function to read the manifests of the existing backups
+
+        Args:
+            None
+
+        Returns:
+            List[dict]: The manifests, oldest first
+        """
+        manifests = []
+        if os.path.exists(self.backup_path):
+            for name in sorted(os.listdir(self.backup_path)):
+                path = os.path.join(self.backup_path, name, "manifest.json")
+                if os.path.exists(path):
+                    with open(path) as f:
+                        manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: m["seq_end"])
+
+    def _snapshot_file(self, src: str, dst: str, appended: bool) -> None:
+        """
+        Function to take a consistent copy of a single file without locking it
+
+        Args:
+            src (str): The table file
+            dst (str): The backup file
+            appended (bool): Whether the file is appended to in place (history, holds) instead of replaced
+
+        Returns:
+            None
+        """
+        if not appended:
+            # replaced files never change in place, a hard link is a free copy-on-write snapshot
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(src, dst)
+
+        # drop a line that was still being appended while the file was copied
+        with open(dst, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def backup(self, incremental: bool = False) -> dict:
+        """
+        Function to take a backup while the tables stay writable
+
+        Args:
+            incremental (bool, optional): Whether to only keep the changes since the previous backup. Defaults to False.
+
+        Returns:
+            dict: The manifest of the backup
+        """
+        try:
+            previous = self._manifests()
+            if incremental and not previous:
+                raise ValueError("No previous backup to take an incremental backup from")
+
+            backup_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+            backup_dir = os.path.join(self.backup_path, backup_id)
+            os.makedirs(backup_dir)
+
+            manifest = {"id": backup_id, "ts": datetime.now().isoformat(), "type": "incremental" if incremental else "full", "tables": {}}
+            if incremental:
+                base = previous[-1]
+                manifest["base"] = base["id"]
+                manifest["seq_start"], manifest["offset_start"] = base["seq_end"], base["offset_end"]
+
+                # the changes since the previous backup are the whole increment
+                seq_end, offset_end = base["seq_end"], base["offset_end"]
+                with open(os.path.join(backup_dir, "changes.jsonl"), "w", encoding="utf-8") as f:
+                    for change, next_offset in self.changelog.read(after=base["seq_end"], offset=base["offset_end"]):
+                        f.write(json.dumps(change) + "\n")
+                        seq_end, offset_end = change["seq"], next_offset
+            else:
+                manifest["seq_start"], manifest["offset_start"] = self.changelog.tail()
+                for table, (file_path, key_col, _) in self.tables.items():
+                    manifest["tables"][table] = []
+                    for path in existing_paths(file_path) if key_col else [p for p in [file_path] if os.path.exists(p)]:
+                        self._snapshot_file(src=path, dst=os.path.join(backup_dir, os.path.basename(path)), appended=key_col is None)
+                        manifest["tables"][table].append(os.path.basename(path))
+                seq_end, offset_end = self.changelog.tail()
+
+            # the files hold every change up to seq_start and possibly some up to seq_end
+            manifest["seq_end"], manifest["offset_end"] = seq_end, offset_end
+            with open(os.path.join(backup_dir, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+            self.logger.info(f"{manifest['type'].capitalize()} backup {backup_id} taken up to change {seq_end}.")
+            return manifest
+        except Exception as e:
+            self.logger.error(f"Error taking backup: {e}")
+            raise e
+
+    def _changes(self, after: int, offset: int, until: Union[int, None]) -> List[dict]:
+        """
+        Function to collect the changes after a sequence number from the incremental backups and the live log
+
+        Args:
+            after (int): Only changes with a greater sequence number are returned
+            offset (int): The byte offset of that change in the live log
+            until (Union[int, None]): The last sequence number to return, None for all
+
+        Returns:
+            List[dict]: The changes in sequence order
+        """
+        changes = {}
+        for manifest in self._manifests():
+            if manifest["type"] != "incremental" or manifest["seq_end"] <= after:
+                continue
+            with open(os.path.join(self.backup_path, manifest["id"], "changes.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    change = json.loads(line)
+                    changes[change["seq"]] = change
+        for change, _ in self.changelog.read(after=after, offset=offset):
+            changes[change["seq"]] = change
+        return [changes[seq] for seq in sorted(changes) if seq > after and (until is None or seq <= until)]
+
+    @classmethod
+    def _effective(cls, changes: List[dict], until: int) -> List[dict]:
+        """
+        Function to get the changes the tables held after a given change. A restore marker replaces the
+        changes before it with the ones that held after its target, so undone changes are skipped.
+
+        Args:
+            changes (List[dict]): The logged changes in sequence order, restore markers included
+            until (int): The sequence number of the change
+
+        Returns:
+            List[dict]: The changes in effect after it, in sequence order, without restore markers
+        """
+        effective = []
+        for change in changes:
+            if change["seq"] > until:
+                break
+            if change["op"] == "restore":
+                effective = cls._effective(changes, until=change["values"]["seq"])
+            else:
+                effective.append(change)
+        return effective
+
+    def _seq_at(self, ts: datetime) -> int:
+        """
+        Function to find the last change made at or before a point in time
+
+        Args:
+            ts (datetime): The point in time
+
+        Returns:
+            int: The sequence number of that change, 0 if there is none
+        """
+        seq = 0
+        for change in self._changes(after=0, offset=0, until=None):
+            if datetime.fromisoformat(change["ts"]) > ts:
+                break
+            seq = change["seq"]
+        return seq
+
+    def restore(self, seq: Union[int, None] = None, ts: Union[datetime, None] = None) -> int:
+        """
+        Function to restore the tables to the state they had after a given change or at a given time.
+        A restore marker is appended to the change log, so later restores and the replicas skip the changes it undid.
+
+        Args:
+            seq (Union[int, None], optional): The sequence number to restore to. Defaults to the latest change.
+            ts (Union[datetime, None], optional): The point in time to restore to, used if seq is not given. Defaults to None.
+
+        Returns:
+            int: The sequence number the tables were restored to
+        """
+        try:
+            with self.context.locked(*(file_path for file_path, _, _ in self.tables.values())):
+                if seq is None:
+                    seq = self._seq_at(ts) if ts is not None else self.changelog.tail()[0]
+
+                # the full backup must not hold any change past the target, replaying cannot undo them
+                fulls = [m for m in self._manifests() if m["type"] == "full" and m["seq_end"] <= seq]
+                if not fulls:
+                    raise ValueError(f"No full backup taken before change {seq}")
+                changes = self._changes(after=fulls[0]["seq_start"], offset=fulls[0]["offset_start"], until=seq)
+
+                # nor may a restore after it have undone changes the backup holds
+                base = next((m for m in reversed(fulls) if all(c["values"]["seq"] >= m["seq_end"] for c in changes if c["op"] == "restore" and c["seq"] > m["seq_start"])), None)
+                if base is None:
+                    raise ValueError(f"No full backup holds the state before change {seq}, every one holds changes undone by a later restore")
+                changes = self._effective([c for c in changes if c["seq"] > base["seq_start"]], until=seq)
+                backup_dir = os.path.join(self.backup_path, base["id"])
+
+                # put back the files of the backup, replacing the current layout of each table
+                for table, (file_path, key_col, _) in self.tables.items():
+                    for path in existing_paths(file_path) if key_col else [p for p in [file_path] if os.path.exists(p)]:
+                        os.remove(path)
+                    for name in base["tables"].get(table, []):
+                        tmp_path = os.path.join(os.path.dirname(file_path), f"{name}.tmp")
+                        shutil.copyfile(os.path.join(backup_dir, name), tmp_path)
+                        os.replace(tmp_path, os.path.join(os.path.dirname(file_path), name))
+
+                self._replay(changes=changes, layout=base["tables"])
+                self.changelog.append(table=None, op="restore", values={"seq": seq, "backup": base["id"]})
+                self.logger.info(f"Restored backup {base['id']} and replayed {len(changes)} changes up to change {seq}.")
+                return seq
+        except Exception as e:
+            self.logger.error(f"Error restoring backup: {e}")
+            raise e
+
+    def _replay(self, changes: List[dict], layout: Dict[str, List[str]]) -> None:
+        """
+        Function to apply logged changes to the restored files. Keyed changes are idempotent and
+        appends already present in the files are skipped, so changes the backup already holds are harmless.
+
+        Args:
+            changes (List[dict]): The changes in sequence order
+            layout (Dict[str, List[str]]): The files of each table in the backup
+
+        Returns:
+            None
+        """
+        # keyed tables are replayed with the same coalescing logic the replicas use, on the restored files
+        # and without following the live log
+        replica = Replica(changelog=self.changelog, max_staleness=float("inf"))
+        for table, (file_path, key_col, dtypes) in self.tables.items():
+            if key_col:
+                replica.register(table=table, file_path=file_path, key_col=key_col, dtypes=dtypes)
+        replica.apply(changes)
+
+        for table, (file_path, key_col, dtypes) in self.tables.items():
+            if key_col:
+                df = replica.table(table).reset_index(drop=True)
+                # written back in the shard layout the backup was taken with
+                shards = len(layout.get(table, [])) or 1
+                shard = shard_of(df[key_col], shards) if shards > 1 else 0
+                for i, path in enumerate(shard_paths(file_path, shards)):
+                    write_csv(df[shard == i] if shards > 1 else df, path)
+                write_layout(file_path, shards)
+            else:
+                self._replay_appends(table=table, file_path=file_path, dtypes=dtypes, changes=changes)
+
+    def _replay_appends(self, table: str, file_path: str, dtypes: Dict[str, str], changes: List[dict]) -> None:
+        """
+        Function to apply logged appends and deletes to a table without a primary key (history, holds)
+
+        Args:
+            table (str): The table name
+            file_path (str): The path of the table file
+            dtypes (Dict[str, str]): The schema dtypes of the table
+            changes (List[dict]): The changes in sequence order
+
+        Returns:
+            None
+        """
+        df = read_shard(file_path, dtypes)
+        appended = []
+
+        def flush(df: pd.DataFrame) -> pd.DataFrame:
+            if appended:
+                rows = apply_dtypes(pd.DataFrame(appended), dtypes)
+                df = rows if df.empty else pd.concat([df, rows], ignore_index=True)
+                appended.clear()
+            return df.drop_duplicates(ignore_index=True)
+
+        for change in changes:
+            if change["table"] != table:
+                continue
+            if change["op"] == "append":
+                appended.append(change["values"])
+            elif change["op"] == "delete":
+                df = flush(df)
+                mask = pd.Series(True, index=df.index)
+                for col, val in change["values"].items():
+                    mask &= df[col].astype(object) == val
+                df = df.drop(index=df.index[mask][:1])
+        write_csv(flush(df), file_path)
+
+    def full_backup(self) -> None:
+        """
+        Function to take a full backup from the menu
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.backup(incremental=False)
+
+    def incremental_backup(self) -> None:
+        """
+        Function to take an incremental backup from the menu
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.backup(incremental=True)
+
+    def list_backups(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to list the backups
+
+        Args:
+            print_output (bool, optional): Whether to print the output. Defaults to True.
+
+        Returns:
+            Union[None, pd.DataFrame]: The backups if print_output is False
+        """
+        backups = pd.DataFrame(self._manifests(), columns=["id", "ts", "type", "seq_start", "seq_end"])
+        if not print_output:
+            return backups
+        print(backups)
+
+    def restore_backup(self) -> None:
+        """
+        Function to restore the tables from the menu
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        target = input("Enter change number or time (YYYY-MM-DD HH:MM:SS) to restore to, blank for the latest: ").strip()
+        if target == "":
+            self.restore()
+        elif target.isdigit():
+            self.restore(seq=int(target))
+        else:
+            self.restore(ts=datetime.fromisoformat(target))
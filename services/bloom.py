@@ -0,0 +1,183 @@
+from typing import Iterable, Tuple, Union
+import math
+import os
+
+import numpy as np
+
+from config.log import db_logger
+
+# splitmix64 constants, the hashes of sequential keys (user ids, isbns) are spread over the whole filter
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+# counters saturate instead of wrapping, a saturated counter is never decremented again
+_MAX_COUNT = 255
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """
+    Function to hash 64 bit integers with splitmix64
+
+    Args:
+        x (np.ndarray): The values as uint64
+
+    Returns:
+        np.ndarray: The hashes as uint64
+    """
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+class CountingBloomFilter():
+    """
+    Counting Bloom filter over integer primary keys. A key that is not in the filter is guaranteed not
+    to be in the table, a key that is in it exists with a false positive rate of error_rate while the
+    filter holds at most capacity keys. Counters instead of bits allow keys to be removed again.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        self.logger = db_logger.getChild("CountingBloomFilter")
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+
+        # optimal number of counters and hash functions for the capacity and error rate
+        self.size = max(int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.counters = np.zeros(self.size, dtype="uint8")
+        self.count = 0
+
+        # signature of the table the filter was built for
+        self.signature: Tuple[int, int] = (0, 0)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _positions(self, keys: Union[int, Iterable[int]]) -> np.ndarray:
+        """
+        Function to get the counters of one or many keys by double hashing
+
+        Args:
+            keys (Union[int, Iterable[int]]): The key(s)
+
+        Returns:
+            np.ndarray: The counter positions, one row of hashes counters per key
+        """
+        x = np.atleast_1d(np.asarray(keys, dtype="int64")).view("uint64")
+        h1 = _mix(x)
+        h2 = _mix(h1) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype="uint64")
+        return ((h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.size)).astype("int64")
+
+    @classmethod
+    def build(cls, keys: np.ndarray, capacity: int, error_rate: float = 0.01) -> "CountingBloomFilter":
+        """
+        Function to build a filter from all the keys of a table at once
+
+        Args:
+            keys (np.ndarray): The keys
+            capacity (int): The number of keys the filter is sized for
+            error_rate (float, optional): The false positive rate at capacity. Defaults to 0.01.
+
+        Returns:
+            CountingBloomFilter: The filter
+        """
+        bloom = cls(capacity=capacity, error_rate=error_rate)
+        if len(keys):
+            counts = np.bincount(bloom._positions(keys).ravel(), minlength=bloom.size)
+            bloom.counters = np.minimum(counts, _MAX_COUNT).astype("uint8")
+        bloom.count = len(keys)
+        return bloom
+
+    def add(self, key: int) -> None:
+        """
+        Function to add a key
+
+        Args:
+            key (int): The key
+
+        Returns:
+            None
+        """
+        for position in self._positions(key)[0]:
+            if self.counters[position] < _MAX_COUNT:
+                self.counters[position] += 1
+        self.count += 1
+
+    def remove(self, key: int) -> None:
+        """
+        Function to remove a key that was added before
+
+        Args:
+            key (int): The key
+
+        Returns:
+            None
+        """
+        for position in self._positions(key)[0]:
+            if 0 < self.counters[position] < _MAX_COUNT:
+                self.counters[position] -= 1
+        self.count = max(self.count - 1, 0)
+
+    def update(self, added: np.ndarray, removed: np.ndarray) -> None:
+        """
+        Function to add and remove many keys at once, e.g. the keys changed by a whole table write
+
+        Args:
+            added (np.ndarray): The keys to add, a key can be repeated
+            removed (np.ndarray): The keys to remove that were added before, a key can be repeated
+
+        Returns:
+            None
+        """
+        counters = self.counters.astype("int64")
+        saturated = counters >= _MAX_COUNT
+        if len(added):
+            counters += np.bincount(self._positions(added).ravel(), minlength=self.size)
+        if len(removed):
+            counters -= np.bincount(self._positions(removed).ravel(), minlength=self.size)
+        self.counters = np.where(saturated, _MAX_COUNT, np.clip(counters, 0, _MAX_COUNT)).astype("uint8")
+        self.count = max(self.count + len(added) - len(removed), 0)
+
+    def __contains__(self, key: int) -> bool:
+        return bool(self.counters[self._positions(key)[0]].all())
+
+    def save(self, path: str) -> None:
+        """
+        Function to persist the filter and the signature of its table
+
+        Args:
+            path (str): The path of the filter file
+
+        Returns:
+            None
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, counters=self.counters, meta=np.array([self.capacity, self.count, *self.signature], dtype="int64"), error_rate=np.array([self.error_rate]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Union["CountingBloomFilter", None]:
+        """
+        Function to load a persisted filter
+
+        Args:
+            path (str): The path of the filter file
+
+        Returns:
+            Union[CountingBloomFilter, None]: The filter, None if there is no usable file
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                capacity, count, mtime, size = (int(v) for v in data["meta"])
+                bloom = cls(capacity=capacity, error_rate=float(data["error_rate"][0]))
+                if len(data["counters"]) != bloom.size:
+                    return None
+                bloom.counters = data["counters"].copy()
+        except (OSError, ValueError, KeyError):
+            return None
+        bloom.count = count
+        bloom.signature = (mtime, size)
+        return bloom
@@ -1,20 +1,25 @@
 from typing import Union
-import os
 
 import pandas as pd
 
 from services.db import DB
+from services.context import StorageContext, default_context
+from services.schema import schema_dtypes, apply_dtypes
 from models.book import Book, AddBook, DeleteBook
 
-from config.config import BOOKS_STORAGE_FILE_NAME, BOOKS_STORAGE_FILE_PATH
 from config.log import db_logger
 
 class BooksDB(DB):
-    def __init__(self, file_path = os.path.join(BOOKS_STORAGE_FILE_PATH, f"{BOOKS_STORAGE_FILE_NAME}")):
-        self.file_path = file_path
+    def __init__(self, file_path: Union[str, None] = None, context: Union[StorageContext, None] = None):
+        context = context or default_context()
+        self.file_path = file_path or context.books_file_path
         self.logger = db_logger.getChild("BooksDB")
         self.columns = list(Book.model_fields.keys())
-        super().__init__(columns=self.columns)
+        super().__init__(columns=self.columns, dtypes=schema_dtypes(Book, keys=["isbn"], categorical=["author"]), key_col="isbn", shards=context.books_shards, context=context)
+
+        # read only processes (kiosks, search nodes) share the mapped catalogue snapshot
+        if context.books_snapshot_reads:
+            self._open_snapshot(file_path=self.file_path, key_col="isbn")
 
     def check_isbn(self, isbn: int) -> bool:
         """
@@ -35,39 +40,46 @@ class BooksDB(DB):
             self.logger.error(f"Error searching book in storage: {e}")
             raise e
 
-    def update_availability(self, new_book: AddBook, increase: bool = True) -> None:
+    def update_availability(self, new_book: AddBook, increase: bool = True, restock: bool = False) -> bool:
         """
         Function to update the availability of a book in the storage
 
         Args:
             new_book (AddBook): The new book details
             increase (bool, optional): Whether to increase the availability. Defaults to True.
+            restock (bool, optional): Whether the copies are new to the library and add to its stock instead of being returned. Defaults to False.
 
         Returns:
-            None
+            bool: True if the availability was updated, False otherwise
         """
         try:
-            # check if the book with the given isbn exists
-            book = self._search(file_path=self.file_path, key="isbn", val=new_book.isbn)
+            with self.context.locked(self.file_path):
+                # check if the book with the given isbn exists, hot books are served by the record cache
+                book = self._record(model=Book, key=new_book.isbn)
             
-            # if the book exists, update the availability
-            if book['title'].values[0] == new_book.title and book['author'].values[0] == new_book.author:
-                # if increase is True, increase the availability
-                # else decrease the availability
-                if increase:
-                    new_book.availability += book['availability'].values[0]
+                # if the book exists, update the availability
+                if book is not None and book.title == new_book.title and book.author == new_book.author:
+                    # if increase is True, increase the availability
+                    # else decrease the availability
+                    if increase:
+                        added = new_book.availability
+                        new_book.availability += book.availability
+                    else:
+                        if book.availability == 0:
+                            self.logger.warning("Book is already unavailable. Not updating availability.")
+                            return False
+                        new_book.availability = book.availability - 1
                 else:
-                    if book['availability'].values[0] == 0:
-                        self.logger.warning("Book is already unavailable. Not updating availability.")
-                        return
-                    new_book.availability = book['availability'].values[0] - 1
-            else:
-                self.logger.warning("Book details do not match. Not updating availability.")
-                return
+                    self.logger.warning("Book details do not match. Not updating availability.")
+                    return False
 
-            # update the availability in the storage
-            self._update(file_path=self.file_path, key_col="isbn", data=new_book)
-            self.logger.info("Book availability increased.")
+                # update the availability, and the stock for new copies, in the storage
+                update = Book(isbn=new_book.isbn, title=new_book.title, author=new_book.author, availability=new_book.availability)
+                if increase and restock and book.stock is not None:
+                    update.stock = book.stock + added
+                self._update(file_path=self.file_path, key_col="isbn", data=update)
+                self.logger.info("Book availability updated.")
+                return True
         except Exception as e:
             self.logger.error(f"Error increasing book availability: {e}")
             raise e
@@ -83,20 +95,71 @@ class BooksDB(DB):
             None
         """
         try:
-            book = AddBook(**self._ask_for_input(AddBook.model_fields))
+            book = AddBook(**self._ask_for_input(AddBook))
 
             # check if the book with the given isbn already exists
             if self.check_isbn(isbn=book.isbn):
-                self.update_availability(new_book=book)
+                self.update_availability(new_book=book, restock=True)
                 return
             
-            # add the book to the storage
-            self._add(file_path=self.file_path, data=book)
+            # add the book to the storage, every copy is in stock and available
+            self._add(file_path=self.file_path, data=Book(**book.model_dump(), stock=book.availability))
             self.logger.info("Book added.")
         except Exception as e:
             self.logger.error(f"Error adding book to storage: {e}")
             raise e
     
+    def add_books(self) -> None:
+        """
+        Function to add many books at once from a file or stdin, e.g. scanned at the desk.
+        Books that already exist get their availability increased, all changes are written at once.
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        try:
+            books = self._ask_for_batch(AddBook)
+            if not books:
+                self.logger.warning("No valid books to add.")
+                return
+
+            # copies of the same isbn scanned several times add up
+            books = pd.DataFrame([book.model_dump() for book in books])
+            books = books.groupby("isbn", sort=False).agg({"title": "first", "author": "first", "availability": "sum"}).reset_index()
+            with self.context.locked(self.file_path):
+
+                df = self._load(file_path=self.file_path).copy()
+                existing = df.merge(books, on="isbn", how="inner", suffixes=("", "_new"))
+
+                # like update_availability, existing books only get copies if their details match
+                mismatch = (existing["title"].astype(str) != existing["title_new"].astype(str)) | (existing["author"].astype(str) != existing["author_new"].astype(str))
+                for isbn in existing.loc[mismatch, "isbn"]:
+                    self.logger.warning(f"Book details do not match for isbn {isbn}. Not updating availability.")
+
+                increments = existing[~mismatch].set_index("isbn")["availability_new"]
+                matched = df["isbn"].isin(increments.index)
+                df.loc[matched, "availability"] = df.loc[matched, "availability"] + df.loc[matched, "isbn"].map(increments).astype("Int64")
+                df.loc[matched, "stock"] = df.loc[matched, "stock"] + df.loc[matched, "isbn"].map(increments).astype("Int64")
+                updated = df.loc[matched, ["isbn", "availability", "stock"]]
+
+                new_books = books[~books["isbn"].isin(df["isbn"])]
+                new_books = apply_dtypes(new_books.assign(stock=new_books["availability"]), self.dtypes)
+                if not new_books.empty:
+                    df = new_books if df.empty else pd.concat([df, new_books], ignore_index=True)
+
+                self._store(file_path=self.file_path, df=df)
+                for record in self._records(updated):
+                    self._emit(file_path=self.file_path, op="update", key=record["isbn"], values=record)
+                for record in self._records(new_books):
+                    self._emit(file_path=self.file_path, op="insert", key=record["isbn"], values=record)
+                self.logger.info(f"{len(new_books)} books added, {len(updated)} books availability updated.")
+        except Exception as e:
+            self.logger.error(f"Error adding books to storage: {e}")
+            raise e
+
     def delete_book(self) -> None:
         """
         Function to delete a book from the storage
@@ -108,7 +171,7 @@ class BooksDB(DB):
             None
         """
         try:
-            book = DeleteBook(**self._ask_for_input(DeleteBook.model_fields))
+            book = DeleteBook(**self._ask_for_input(DeleteBook))
             
             # check if the book with the given isbn exists
             if not self.check_isbn(isbn=book.isbn):
@@ -133,7 +196,7 @@ class BooksDB(DB):
             None
         """
         try:
-            book = Book(**self._ask_for_input(Book.model_fields))
+            book = Book(**self._ask_for_input(Book))
 
             # check if the book with the given isbn exists
             if not self.check_isbn(isbn=book.isbn):
@@ -159,7 +222,7 @@ class BooksDB(DB):
             Union[None, pd.DataFrame]: The data that was found if print_output is False
         """
         try:
-            book = Book(**self._ask_for_input(Book.model_fields))
+            book = Book(**self._ask_for_input(Book))
 
             # Individual search for isbn, title, and author
             if book.isbn:
@@ -196,4 +259,91 @@ class BooksDB(DB):
             print(self._list(file_path=self.file_path))
         except Exception as e:
             self.logger.error(f"Error listing books in storage: {e}")
+            raise e
+
+    def write_snapshot(self) -> None:
+        """
+        Function to write the memory mapped snapshot of the catalogue used by read only processes
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        try:
+            self._write_snapshot(file_path=self.file_path, key_col="isbn")
+        except Exception as e:
+            self.logger.error(f"Error writing books snapshot: {e}")
+            raise e
+
+    def validate_books(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to validate every book in the storage, one worker process per shard
+
+        Args:
+            print_output (bool, optional): Whether to print the output. Defaults to True.
+
+        Returns:
+            Union[None, pd.DataFrame]: The invalid books if print_output is False
+        """
+        try:
+            errors = self._validate(file_path=self.file_path, model=AddBook)
+            if not print_output:
+                return errors
+            print(errors)
+        except Exception as e:
+            self.logger.error(f"Error validating books in storage: {e}")
+            raise e
+
+    def books_report(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to report the number of titles and available copies per author, one worker process per shard
+
+        Args:
+            print_output (bool, optional): Whether to print the output. Defaults to True.
+
+        Returns:
+            Union[None, pd.DataFrame]: The report if print_output is False
+        """
+        try:
+            report = self._summarize(file_path=self.file_path, group_col="author")
+            if not print_output:
+                return report
+            print(report)
+        except Exception as e:
+            self.logger.error(f"Error generating books report: {e}")
+            raise e
+
+    def import_books(self) -> None:
+        """
+        Function to import books from a CSV file, replacing the books with the same isbn
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        try:
+            total = self._import(file_path=self.file_path, source_path=input("Enter path of the CSV file to import: "))
+            self.logger.info(f"Books imported, {total} books in storage.")
+        except Exception as e:
+            self.logger.error(f"Error importing books into storage: {e}")
+            raise e
+
+    def reshard_books(self) -> None:
+        """
+        Function to redistribute the books over a new number of shards, the new layout is recorded beside the table
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        try:
+            self._reshard(file_path=self.file_path, shards=int(input("Enter number of shards: ")))
+        except Exception as e:
+            self.logger.error(f"Error resharding books: {e}")
             raise e
\ No newline at end of file
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Union
+import time
+
+from pydantic import BaseModel
+
+from config.log import db_logger
+
+class RecordCache():
+    """
+    Bounded LRU cache of validated records keyed by primary key. Entries older than ttl seconds are
+    dropped on access and the least recently used entry is evicted once maxsize records are held.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Union[float, None] = None) -> None:
+        self.logger = db_logger.getChild("RecordCache")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (time the record was cached, record), least recently used first
+        self._records: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, key: Hashable) -> Union[BaseModel, None]:
+        """
+        Function to get a cached record, marking it as recently used
+
+        Args:
+            key (Hashable): The primary key of the record
+
+        Returns:
+            Union[BaseModel, None]: The record, None if it is not cached or expired
+        """
+        entry = self._records.get(key)
+        if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+            del self._records[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._records.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, record: BaseModel) -> None:
+        """
+        Function to cache a record, evicting the least recently used records beyond maxsize
+
+        Args:
+            key (Hashable): The primary key of the record
+            record (BaseModel): The validated record
+
+        Returns:
+            None
+        """
+        self._records[key] = (time.monotonic(), record)
+        self._records.move_to_end(key)
+        while len(self._records) > self.maxsize:
+            self._records.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Function to drop a record that was changed or deleted
+
+        Args:
+            key (Hashable): The primary key of the record
+
+        Returns:
+            None
+        """
+        self._records.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Function to drop every record, e.g. when another writer changed the table
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._records.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Function to report how well the cache is doing
+
+        Args:
+            None
+
+        Returns:
+            Dict[str, Union[int, float]]: The size, hits, misses, hit rate and evictions of the cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._records),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,248 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks on Windows, a single writer process is assumed there
+    fcntl = None
+
+from config.log import db_logger
+
+class ChangeLog():
+    """
+    Append-only, ordered feed of every mutation made through DB, stored as one JSON change per line:
+    {"seq", "ts", "table", "op", "key", "values"}. Consumers resume from the sequence number and
+    byte offset they stopped at, and in-process subscribers are called as changes are appended.
+    """
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.logger = db_logger.getChild("ChangeLog")
+        self._subscribers: List[Callable[[dict], None]] = []
+
+        # last sequence number and the log size it was read at, re-read only if another process appended
+        self._seq = 0
+        self._size = -1
+
+    def _last_seq(self) -> int:
+        """
+        Function to get the sequence number of the last change, reading only the tail of the log
+
+        Args:
+            None
+
+        Returns:
+            int: The last sequence number, 0 if the log is empty
+        """
+        size = os.path.getsize(self.file_path) if os.path.exists(self.file_path) else 0
+        if size == self._size:
+            return self._seq
+
+        seq = 0
+        if size:
+            with open(self.file_path, "rb") as f:
+                block = 4096
+                while True:
+                    f.seek(max(size - block, 0))
+                    lines = f.read().splitlines()
+                    if len(lines) > 1 or block >= size:
+                        break
+                    block *= 2
+            seq = json.loads(lines[-1])["seq"]
+        self._seq, self._size = seq, size
+        return seq
+
+    def tail(self) -> Tuple[int, int]:
+        """
+        Function to get the current end of the log, the position a new consumer starts from
+
+        Args:
+            None
+
+        Returns:
+            Tuple[int, int]: The last sequence number and the byte offset after it
+        """
+        seq = self._last_seq()
+        return (seq, self._size)
+
+    def append(self, table: Union[str, None], op: str, key=None, values: Union[dict, None] = None) -> int:
+        """
+        Function to append a change to the log and notify the subscribers
+
+        Args:
+            table (Union[str, None]): The table that changed, None for a change of every table
+            op (str): The operation: insert, update, delete, append or upsert, or restore when the tables
+                were restored to the state after the change values["seq"] and the changes since no longer hold
+            key (optional): The primary key of the changed row, None for tables without one. Defaults to None.
+            values (Union[dict, None], optional): The new values, or the matched values for a delete. Defaults to None.
+
+        Returns:
+            int: The sequence number of the change
+        """
+        try:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    change = {"seq": self._last_seq() + 1, "ts": datetime.now().isoformat(), "table": table, "op": op, "key": key, "values": values or {}}
+                    f.write(json.dumps(change, default=str) + "\n")
+                    f.flush()
+                    self._seq, self._size = change["seq"], f.tell()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        except Exception as e:
+            self.logger.error(f"Error appending change to log: {e}")
+            raise e
+
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber(change)
+            except Exception as e:
+                self.logger.error(f"Error notifying change subscriber: {e}")
+        return change["seq"]
+
+    def subscribe(self, callback: Callable[[dict], None]) -> None:
+        """
+        Function to call back an in-process subscriber with every change appended from now on
+
+        Args:
+            callback (Callable[[dict], None]): The subscriber
+
+        Returns:
+            None
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict], None]) -> None:
+        """
+        Function to stop calling back a subscriber
+
+        Args:
+            callback (Callable[[dict], None]): The subscriber
+
+        Returns:
+            None
+        """
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def read(self, after: int = 0, offset: int = 0) -> Iterator[Tuple[dict, int]]:
+        """
+        Function to read the changes made after a sequence number
+
+        Args:
+            after (int, optional): Only changes with a greater sequence number are returned. Defaults to 0.
+            offset (int, optional): Byte offset to start reading from, as returned with an earlier change. Defaults to 0.
+
+        Returns:
+            Iterator[Tuple[dict, int]]: Each change with the byte offset right after it
+        """
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, "rb") as f:
+            f.seek(offset)
+            for line in iter(f.readline, b""):
+                # a line without its newline is still being written by another process
+                if not line.endswith(b"\n"):
+                    break
+                change = json.loads(line)
+                if change["seq"] > after:
+                    yield change, f.tell()
+
+    def _offset_path(self, consumer: str) -> str:
+        """
+        Function to get the file holding the committed position of a consumer
+
+        Args:
+            consumer (str): The name of the consumer
+
+        Returns:
+            str: The path of the offset file
+        """
+        return f"{self.file_path}.{consumer}.offset"
+
+    def position(self, consumer: str) -> Tuple[int, int]:
+        """
+        Function to get the position a consumer committed
+
+        Args:
+            consumer (str): The name of the consumer
+
+        Returns:
+            Tuple[int, int]: The last processed sequence number and the byte offset after it
+        """
+        if not os.path.exists(self._offset_path(consumer)):
+            return (0, 0)
+        with open(self._offset_path(consumer)) as f:
+            seq, offset = f.read().split()
+        return (int(seq), int(offset))
+
+    def commit(self, consumer: str, seq: int, offset: int) -> None:
+        """
+        Function to durably record the position of a consumer
+
+        Args:
+            consumer (str): The name of the consumer
+            seq (int): The last processed sequence number
+            offset (int): The byte offset after it
+
+        Returns:
+            None
+        """
+        tmp_path = f"{self._offset_path(consumer)}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{seq} {offset}")
+        os.replace(tmp_path, self._offset_path(consumer))
+
+    def consume(self, consumer: str, handler: Callable[[dict], None], limit: Union[int, None] = None) -> int:
+        """
+        Function to hand the changes a named consumer has not processed yet to its handler,
+        committing its position as it goes so it resumes where it stopped
+
+        Args:
+            consumer (str): The name of the consumer
+            handler (Callable[[dict], None]): Called with each change, in order
+            limit (Union[int, None], optional): The maximum number of changes to process. Defaults to None.
+
+        Returns:
+            int: The number of changes processed
+        """
+        try:
+            start = position = self.position(consumer)
+            count = 0
+            try:
+                for change, next_offset in self.read(after=position[0], offset=position[1]):
+                    if limit is not None and count >= limit:
+                        break
+                    handler(change)
+                    position = (change["seq"], next_offset)
+                    count += 1
+                    if count % 1000 == 0:
+                        self.commit(consumer, *position)
+            finally:
+                # keep the progress made even if the handler failed
+                if position != start:
+                    self.commit(consumer, *position)
+            return count
+        except Exception as e:
+            self.logger.error(f"Error consuming changes for {consumer}: {e}")
+            raise e
+
+_changelogs: Dict[str, ChangeLog] = {}
+
+def open_changelog(file_path: str) -> ChangeLog:
+    """
+    Function to get the change log of a file, shared by every DB of the process
+
+    Args:
+        file_path (str): The path of the log
+
+    Returns:
+        ChangeLog: The change log
+    """
+    if file_path not in _changelogs:
+        _changelogs[file_path] = ChangeLog(file_path=file_path)
+    return _changelogs[file_path]
@@ -1,25 +1,48 @@
-from typing import Union
-import os
+from datetime import datetime, timedelta
+from typing import ContextManager, Dict, Iterable, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
 from services.db import DB
-from models.checkout import Checkout, Return
+from services.schema import schema_dtypes, apply_dtypes
+from services.loan_index import TimeIndex
+from models.checkout import Checkout, Return, LoanHistory, LoanRange
 from models.book import Book
+from models.hold import Hold
 from services.books import BooksDB
 from services.users import UsersDB
+from services.holds import HoldsDB
+from services.context import StorageContext, default_context
 
-from config.config import CHECKOUT_STORAGE_FILE_NAME, CHECKOUT_STORAGE_FILE_PATH
 from config.log import db_logger
 
 class CheckoutDB(DB):
-    def __init__(self, file_path = os.path.join(CHECKOUT_STORAGE_FILE_PATH, f"{CHECKOUT_STORAGE_FILE_NAME}")):
-        self.file_path = file_path
+    def __init__(self, file_path: Union[str, None] = None, history_file_path: Union[str, None] = None, context: Union[StorageContext, None] = None):
+        context = context or default_context()
+        self.file_path = file_path or context.checkout_file_path
+        self.history_file_path = history_file_path or context.history_file_path
+        self.history_dtypes = schema_dtypes(LoanHistory, keys=["isbn", "user_id"])
         self.logger = db_logger.getChild("CheckoutDB")
         self.columns = list(Checkout.model_fields.keys())
-        self.books_db = BooksDB()
-        self.users_db = UsersDB()
-        super().__init__(columns=self.columns)
+
+        # the books, users and holds services of the context, shared with the rest of the process
+        self.books_db = context.instance(BooksDB)
+        self.users_db = context.instance(UsersDB)
+        self.holds_db = context.instance(HoldsDB)
+        super().__init__(columns=self.columns, dtypes=schema_dtypes(Checkout, keys=["isbn", "user_id"]), key_col="isbn", shards=context.checkout_shards, context=context)
+
+        # time-ordered indexes over the open loans and the loan history, the values are row positions
+        # returned loans stay in the indexed rows unreferenced until they are rebuilt
+        self._open_indexes = {"checkout_time": TimeIndex(), "due_date": TimeIndex()}
+        self._open_rows = None
+        self._open_pending = []
+        self._open_positions: Dict[int, int] = {}
+        self._open_signature = None
+        self._history_index = TimeIndex()
+        self._history = None
+        self._history_pending = []
+        self._history_signature = None
 
     def check_isbn(self, isbn: int) -> bool:
         """
@@ -40,46 +63,253 @@ class CheckoutDB(DB):
             self.logger.error(f"Error searching book in storage: {e}")
             raise e
 
-    def checkout(self) -> None:
+    def _open_loans(self) -> pd.DataFrame:
         """
-        Function to checkout a book from the library
+        Function to get the open loans the time indexes point into, loading them only when the storage was changed by another writer
 
         Args:
-            The input from the user
+            None
+
+        Returns:
+            pd.DataFrame: The indexed rows, returned loans are kept but no longer referenced by the indexes
+        """
+        signature = self._signature(self.file_path)
+        if self._open_rows is None or signature != self._open_signature:
+            self._open_rows = self._load(file_path=self.file_path).reset_index(drop=True)
+            self._open_pending = []
+            self._open_positions = dict(zip(self._open_rows["isbn"].tolist(), range(len(self._open_rows))))
+            positions = pd.Series(range(len(self._open_rows)))
+            for col, index in self._open_indexes.items():
+                times = self._open_rows[col] if col in self._open_rows.columns else pd.Series([None] * len(self._open_rows))
+                index.build(times=times, values=positions)
+            self._open_signature = signature
+        elif self._open_pending:
+            self._open_rows = pd.concat([self._open_rows, apply_dtypes(pd.DataFrame(self._open_pending), self.dtypes)], ignore_index=True)
+            self._open_pending = []
+        return self._open_rows
+
+    def _track_open_loan(self, checkout: Checkout, fresh: bool, insert: bool) -> None:
+        """
+        Function to keep the open loan indexes in step with a checkout or return made by this process
+
+        Args:
+            checkout (Checkout): The loan that was added or removed
+            fresh (bool): Whether the indexes were up to date before the write
+            insert (bool): True if the loan was added, False if it was removed
+
+        Returns:
+            None
+        """
+        # if someone else wrote to the storage in between, rebuild on the next read instead
+        if not fresh or self._open_rows is None:
+            self._open_signature = None
+            return
+
+        if insert:
+            position = len(self._open_rows) + len(self._open_pending)
+            self._open_pending.append(checkout.model_dump())
+            self._open_positions[checkout.isbn] = position
+        else:
+            position = self._open_positions.pop(checkout.isbn, None)
+
+        if position is not None:
+            for col, index in self._open_indexes.items():
+                time = getattr(checkout, col)
+                if time is None:
+                    continue
+                if insert:
+                    index.insert(time=time, value=position)
+                else:
+                    index.remove(time=time, value=position)
+
+        # compact once most of the indexed rows are returned loans
+        if len(self._open_rows) + len(self._open_pending) > 2 * len(self._open_positions) + 1024:
+            self._open_signature = None
+            return
+        self._open_signature = self._signature(self.file_path)
+
+    def _loan_history(self) -> pd.DataFrame:
+        """
+        Function to get the loan history, loading it only when the storage was changed by another writer
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame: The loan history in append order
+        """
+        signature = self._signature(self.history_file_path)
+        if self._history is None or signature != self._history_signature:
+            self._history = self._load(file_path=self.history_file_path, dtypes=self.history_dtypes)
+            self._history_pending = []
+            self._history_index.build(times=self._history["checkout_time"], values=pd.Series(range(len(self._history))))
+            self._history_signature = signature
+        elif self._history_pending:
+            self._history = pd.concat([self._history, apply_dtypes(pd.DataFrame(self._history_pending), self.history_dtypes)], ignore_index=True)
+            self._history_pending = []
+        return self._history
+
+    def _append_history(self, loans: List[LoanHistory]) -> None:
+        """
+        Function to append closed loans to the history storage and index with a single write
+
+        Args:
+            loans (List[LoanHistory]): The closed loans
+
+        Returns:
+            None
+        """
+        fresh = self._history is not None and self._history_signature == self._signature(self.history_file_path)
+        self._append_many(file_path=self.history_file_path, data=loans)
+
+        if not fresh:
+            self._history = None
+            return
+
+        for loan in loans:
+            position = len(self._history) + len(self._history_pending)
+            self._history_pending.append(loan.model_dump())
+            if loan.checkout_time is not None:
+                self._history_index.insert(time=loan.checkout_time, value=position)
+        self._history_signature = self._signature(self.history_file_path)
+
+    def _record_loan(self, checkout: Checkout) -> None:
+        """
+        Function to record a loan once the copy has been taken off the shelf
+
+        Args:
+            checkout (Checkout): The loan to be recorded
+
+        Returns:
+            None
+        """
+        # Check if the user is already checked out and update the status
+        self.users_db.update_checkout_status(user_id=checkout.user_id, status=True)
+
+        # Stamp the loan with the checkout time and the due date
+        checkout.checkout_time = datetime.now()
+        checkout.due_date = checkout.checkout_time + timedelta(days=self.context.loan_period_days)
+
+        # Add the book to the storage
+        fresh = self._open_signature == self._signature(self.file_path)
+        self._add(file_path=self.file_path, data=checkout)
+        self._track_open_loan(checkout=checkout, fresh=fresh, insert=True)
+
+    def _assign_to_hold(self, isbn: int, returned_by: Union[int, None] = None) -> bool:
+        """
+        Function to check out a returned copy to the next user waiting for it
+
+        Args:
+            isbn (int): The isbn of the returned book
+            returned_by (Union[int, None], optional): The user who returned the copy, their own hold is dropped. Defaults to None.
+
+        Returns:
+            bool: True if the copy was assigned to a hold, False if nobody is waiting
+        """
+        while self.holds_db.has_holds(isbn=isbn):
+            hold = self.holds_db.next_hold(isbn=isbn)
+
+            # skip holds of users that were removed while waiting
+            if not self.users_db.check_user_id(user_id=hold.user_id):
+                self.logger.warning(f"User {hold.user_id} no longer exists. Skipping hold.")
+                continue
+
+            # a hold of the user who just returned the copy would check it straight back out to them
+            if hold.user_id == returned_by:
+                self.logger.warning(f"User {hold.user_id} returned the book they were waiting for. Skipping hold.")
+                continue
+
+            self._record_loan(checkout=Checkout(isbn=isbn, user_id=hold.user_id))
+            self.logger.info(f"Book checked out to user {hold.user_id} from the hold queue.")
+            return True
+        return False
+
+    def place_hold(self, priority: bool = False) -> None:
+        """
+        Function to place a hold on a book for a user
+
+        Args:
+            priority (bool, optional): Whether this is a staff hold that skips the regular queue. Defaults to False.
+            Takes input from the user
 
         Returns:
             None
         """
         try:
-            # Ask for input from the user
-            checkout = Checkout(**self._ask_for_input(Checkout.model_fields))
-            
+            hold = Hold(**self._ask_for_input(Hold), priority=priority)
+
             # Check if the book exists in the storage
-            if not self.books_db.check_isbn(isbn=checkout.isbn):
-                self.logger.warning("Book does not exist in storage. Not checking out.")
+            if not self.books_db.check_isbn(isbn=hold.isbn):
+                self.logger.warning("Book does not exist in storage. Not placing hold.")
                 return
-            
-            # Check if the book is already checked out
-            if not self.users_db.check_user_id(user_id=checkout.user_id):
-                self.logger.warning("User ID does not exist in storage. Not checking out.")
+
+            # Check if the user exists in the storage
+            if not self.users_db.check_user_id(user_id=hold.user_id):
+                self.logger.warning("User ID does not exist in storage. Not placing hold.")
                 return
 
-            # Check if the book is already checked out
-            if self.check_isbn(isbn=checkout.isbn):
-                self.logger.warning("ISBN already exists in storage. Not checking out.")
+            # Check if the user already has the book on loan
+            if (self._search(file_path=self.file_path, key="isbn", val=hold.isbn)["user_id"] == hold.user_id).any():
+                self.logger.warning("User already has this book checked out. Not placing hold.")
                 return
+
+            self.holds_db.add_hold(hold=hold)
+        except Exception as e:
+            self.logger.error(f"Error adding hold to storage: {e}")
+            raise e
+
+    def place_staff_hold(self) -> None:
+        """
+        Function to place a staff hold that is served before the regular holds
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        self.place_hold(priority=True)
+
+    def checkout(self) -> None:
+        """
+        Function to checkout a book from the library
+
+        Args:
+            The input from the user
+
+        Returns:
+            None
+        """
+        try:
+            # Ask for input from the user
+            checkout = Checkout(**self._ask_for_input(Checkout))
+
+            # the checks and writes of the loan are not interleaved with other threads of the process
+            with self._locked():
+                # Check if the book exists in the storage
+                if not self.books_db.check_isbn(isbn=checkout.isbn):
+                    self.logger.warning("Book does not exist in storage. Not checking out.")
+                    return
             
-            book = Book(**self.books_db._search(file_path=self.books_db.file_path, key="isbn", val=checkout.isbn).to_dict(orient="records")[0])
+                # Check if the book is already checked out
+                if not self.users_db.check_user_id(user_id=checkout.user_id):
+                    self.logger.warning("User ID does not exist in storage. Not checking out.")
+                    return
 
-            # Check if the book is available for checkout and update the availability
-            self.books_db.update_availability(new_book=book, increase=False)
+                # Check if the book is already checked out
+                if self.check_isbn(isbn=checkout.isbn):
+                    self.logger.warning("ISBN already exists in storage. Not checking out.")
+                    return
+            
+                book = self.books_db._record(model=Book, key=checkout.isbn)
 
-            # Check if the user is already checked out and update the status
-            self.users_db.update_checkout_status(user_id=checkout.user_id, status=True)
+                # Check if the book is available for checkout and update the availability
+                if not self.books_db.update_availability(new_book=book, increase=False):
+                    self.logger.warning("Book is not available. Not checking out, place a hold instead.")
+                    return
 
-            # Add the book to the storage
-            self._add(file_path=self.file_path, data=checkout)
-            self.logger.info("Book checked out.")
+                self._record_loan(checkout=checkout)
+                self.logger.info("Book checked out.")
         except Exception as e:
             self.logger.error(f"Error adding book to storage: {e}")
             raise e
@@ -96,43 +326,269 @@ class CheckoutDB(DB):
         """
         try:
             # Ask for input from the user
-            returnb = Return(**self._ask_for_input(Return.model_fields))
-            
-            # Check if the book exists in the storage
-            if not self.books_db.check_isbn(isbn=returnb.isbn):
-                self.logger.warning("Book does not exist in storage. Cannot return.")
-                return
+            returnb = Return(**self._ask_for_input(Return))
+
+            # the checks and writes of the loan are not interleaved with other threads of the process
+            with self._locked():
+                # Check if the book exists in the storage
+                if not self.books_db.check_isbn(isbn=returnb.isbn):
+                    self.logger.warning("Book does not exist in storage. Cannot return.")
+                    return
             
-            # Check if the book is already checked out
-            if not self.check_isbn(isbn=returnb.isbn):
-                self.logger.warning("ISBN does not exist in storage. Cannot return.")
-                return
+                # Check if the book is already checked out
+                if not self.check_isbn(isbn=returnb.isbn):
+                    self.logger.warning("ISBN does not exist in storage. Cannot return.")
+                    return
         
-            checkout_details = Checkout(**self._search(file_path=self.file_path, key="isbn", val=returnb.isbn).to_dict(orient="records")[0])
+                checkout_details = Checkout(**self._records(self._search(file_path=self.file_path, key="isbn", val=returnb.isbn))[0])
 
-            # Check if the user exists in the storage
-            if not self.users_db.check_user_id(user_id=checkout_details.user_id):
-                self.logger.warning("User ID does not exist in storage. Cannot return.")
-                return
-            
-            user_with_books = self._search(file_path=self.file_path, key="user_id", val=checkout_details.user_id)
+                # Check if the user exists in the storage
+                if not self.users_db.check_user_id(user_id=checkout_details.user_id):
+                    self.logger.warning("User ID does not exist in storage. Cannot return.")
+                    return
             
-            book = Book(**self.books_db._search(file_path=self.books_db.file_path, key="isbn", val=returnb.isbn).to_dict(orient="records")[0])
+                user_with_books = self._search(file_path=self.file_path, key="user_id", val=checkout_details.user_id)
             
-            # Check if the book is available for return and update the availability
-            self.books_db.update_availability(new_book=book, increase=True)
+                # Check if the user is already checked out and update the status
+                if len(user_with_books) == 1:
+                    self.users_db.update_checkout_status(user_id=checkout_details.user_id, status=False)
+
+                # Move the closed loan to the append-only history
+                self._append_history([LoanHistory(**checkout_details.model_dump(), return_time=datetime.now())])
+
+                # Remove the book from the storage
+                fresh = self._open_signature == self._signature(self.file_path)
+                self._delete(file_path=self.file_path, data=returnb)
+                self._track_open_loan(checkout=checkout_details, fresh=fresh, insert=False)
+                self.logger.info("Book returned.")
 
-            # Check if the user is already checked out and update the status
-            if len(user_with_books) == 1:
-                self.users_db.update_checkout_status(user_id=checkout_details.user_id, status=False)
+                # Hand the returned copy straight to the next waiting user, otherwise put it back on the shelf
+                if self._assign_to_hold(isbn=returnb.isbn, returned_by=checkout_details.user_id):
+                    return
 
-            # Remove the book from the storage
-            self._delete(file_path=self.file_path, data=returnb)
-            self.logger.info("Book returned.")
+                book = self.books_db._record(model=Book, key=returnb.isbn)
+                book.availability = 1
+                self.books_db.update_availability(new_book=book, increase=True)
         except Exception as e:
             self.logger.error(f"Error removing book from storage: {e}")
             raise e
     
+    def _locked(self) -> ContextManager[None]:
+        """
+        Function to hold the locks of every table a checkout or a return touches: the loans, their
+        history, the books, the users and the holds
+
+        Args:
+            None
+
+        Returns:
+            ContextManager[None]: Holds the locks while the with block runs
+        """
+        return self.context.locked(self.file_path, self.history_file_path, self.books_db.file_path, self.users_db.file_path, self.holds_db.file_path)
+
+    def _reject(self, results: pd.DataFrame, checks: List[Tuple[str, pd.Series]]) -> pd.DataFrame:
+        """
+        Function to record the first failed check of every item of a batch
+
+        Args:
+            results (pd.DataFrame): The items of the batch
+            checks (List[Tuple[str, pd.Series]]): The reason and the mask of failed items of each check, in order
+
+        Returns:
+            pd.DataFrame: The items with their success flag and the reason they failed
+        """
+        results["reason"] = pd.Series([None] * len(results), index=results.index, dtype=object)
+        for reason, failed in checks:
+            results.loc[failed.to_numpy(dtype=bool) & results["reason"].isna().to_numpy(), "reason"] = reason
+        results.insert(len(results.columns) - 1, "success", results["reason"].isna())
+        return results
+
+    def _commit_batch(self, loans: pd.DataFrame, closed: pd.Series, opened: pd.DataFrame, deltas: pd.Series, user_ids: Iterable[int]) -> None:
+        """
+        Function to apply the outcome of a batch of checkouts or returns with one write per table
+
+        Args:
+            loans (pd.DataFrame): The open loans after the batch
+            closed (pd.Series): The isbns of the loans that were closed
+            opened (pd.DataFrame): The loans that were opened
+            deltas (pd.Series): The change of availability of each isbn
+            user_ids (Iterable[int]): The users whose checkout status may have changed
+
+        Returns:
+            None
+        """
+        # availability changes summed per book
+        books = self.books_db._load(file_path=self.books_db.file_path).copy()
+        changed = books["isbn"].isin(deltas.index)
+        if changed.any():
+            books.loc[changed, "availability"] = books.loc[changed, "availability"].fillna(0) + books.loc[changed, "isbn"].map(deltas).astype("Int64")
+            self.books_db._store(file_path=self.books_db.file_path, df=books)
+
+        # a user is checked out exactly when one of the open loans is theirs
+        users = self.users_db._load(file_path=self.users_db.file_path).copy()
+        status = users["user_id"].isin(loans["user_id"].to_numpy())
+        flipped = users["user_id"].isin(list(user_ids)) & (users["is_checked_out"].astype(bool) != status)
+        if flipped.any():
+            users.loc[flipped, "is_checked_out"] = status[flipped]
+            self.users_db._store(file_path=self.users_db.file_path, df=users)
+
+        self._store(file_path=self.file_path, df=loans)
+
+        for isbn in closed:
+            self._emit(file_path=self.file_path, op="delete", key=isbn, values={"isbn": isbn})
+        for record in self._records(opened):
+            self._emit(file_path=self.file_path, op="insert", key=record["isbn"], values=record)
+        for record in self._records(books.loc[changed, ["isbn", "availability"]]):
+            self.books_db._emit(file_path=self.books_db.file_path, op="update", key=record["isbn"], values=record)
+        for record in self._records(users.loc[flipped, ["user_id", "is_checked_out"]]):
+            self.users_db._emit(file_path=self.users_db.file_path, op="update", key=record["user_id"], values=record)
+
+    def _new_loans(self, isbns: Iterable[int], user_ids: Iterable[int]) -> pd.DataFrame:
+        """
+        Function to build the loans of a batch, stamped with the checkout time and the due date
+
+        Args:
+            isbns (Iterable[int]): The isbns of the books
+            user_ids (Iterable[int]): The users the books are checked out to
+
+        Returns:
+            pd.DataFrame: The loans with the dtypes of the storage
+        """
+        now = datetime.now()
+        loans = pd.DataFrame({"isbn": list(isbns), "user_id": list(user_ids)})
+        loans["checkout_time"] = now
+        loans["due_date"] = now + timedelta(days=self.context.loan_period_days)
+        return apply_dtypes(loans, self.dtypes)
+
+    def checkout_many(self, checkouts: List[Checkout]) -> pd.DataFrame:
+        """
+        Function to check out many books at once, e.g. at the circulation desk. All items are validated
+        together and the changes are written with one write per table.
+
+        Args:
+            checkouts (List[Checkout]): The books to check out and the users they go to
+
+        Returns:
+            pd.DataFrame: The isbn, user_id, success flag and failure reason of every item, in input order
+        """
+        try:
+            with self._locked():
+                results = pd.DataFrame({"isbn": [c.isbn for c in checkouts], "user_id": [c.user_id for c in checkouts]}, dtype="Int64")
+                books = self.books_db._load(file_path=self.books_db.file_path).drop_duplicates(subset="isbn", keep="last")
+                users = self.users_db._load(file_path=self.users_db.file_path)
+                loans = self._load(file_path=self.file_path)
+
+                availability = results["isbn"].map(books.set_index("isbn")["availability"]).astype("Int64").fillna(0)
+                results = self._reject(results, [
+                    ("Book does not exist", ~results["isbn"].isin(books["isbn"].to_numpy())),
+                    ("User ID does not exist", ~results["user_id"].isin(users["user_id"].to_numpy())),
+                    ("Book is already checked out", results["isbn"].isin(loans["isbn"].to_numpy())),
+                    ("Book is already in the batch", results["isbn"].duplicated()),
+                    ("Book is not available, place a hold instead", availability < 1),
+                ])
+
+                accepted = results[results["success"]]
+                if not accepted.empty:
+                    opened = self._new_loans(isbns=accepted["isbn"], user_ids=accepted["user_id"])
+                    self._commit_batch(
+                        loans=opened if loans.empty else pd.concat([loans, opened], ignore_index=True),
+                        closed=pd.Series(dtype="int64"),
+                        opened=opened,
+                        deltas=-accepted.groupby("isbn").size(),
+                        user_ids=accepted["user_id"].to_numpy(),
+                    )
+                self.logger.info(f"{len(accepted)} of {len(results)} book(s) checked out.")
+                return results
+        except Exception as e:
+            self.logger.error(f"Error checking out books: {e}")
+            raise e
+
+    def return_many(self, isbns: List[int]) -> pd.DataFrame:
+        """
+        Function to return many books at once. The closed loans are moved to the history, returned
+        copies go to the next waiting user and the changes are written with one write per table.
+
+        Args:
+            isbns (List[int]): The isbns of the returned books
+
+        Returns:
+            pd.DataFrame: The isbn, borrowing user_id, success flag, failure reason and the user the copy
+                was handed to from the hold queue of every item, in input order
+        """
+        try:
+            with self._locked():
+                results = pd.DataFrame({"isbn": isbns}, dtype="Int64")
+                books = self.books_db._load(file_path=self.books_db.file_path)
+                users = self.users_db._load(file_path=self.users_db.file_path)
+                loans = self._load(file_path=self.file_path)
+
+                results["user_id"] = results["isbn"].map(loans.drop_duplicates(subset="isbn", keep="last").set_index("isbn")["user_id"]).astype("Int64")
+                results = self._reject(results, [
+                    ("Book does not exist", ~results["isbn"].isin(books["isbn"].to_numpy())),
+                    ("Book is not checked out", results["user_id"].isna()),
+                    ("Book is already in the batch", results["isbn"].duplicated()),
+                    ("User ID does not exist", ~results["user_id"].isin(users["user_id"].to_numpy())),
+                ])
+                results["hold_user_id"] = pd.Series(pd.NA, index=results.index, dtype="Int64")
+
+                accepted = results[results["success"]]
+                if not accepted.empty:
+                    returned = loans["isbn"].isin(accepted["isbn"].to_numpy())
+                    now = datetime.now()
+                    self._append_history([LoanHistory(**record, return_time=now) for record in self._records(loans.loc[returned, list(Checkout.model_fields)])])
+
+                    # returned copies go straight to the next waiting user, the others back on the shelf
+                    holds = self.holds_db.take_holds(isbns=accepted["isbn"].tolist(), user_ids=set(users["user_id"].tolist()), borrowers=dict(zip(accepted["isbn"].tolist(), accepted["user_id"].tolist())))
+                    results.loc[results["success"], "hold_user_id"] = accepted["isbn"].map({isbn: hold.user_id for isbn, hold in holds.items()}).astype("Int64")
+                    opened = self._new_loans(isbns=list(holds), user_ids=[hold.user_id for hold in holds.values()])
+                    remaining = loans[~returned]
+
+                    shelved = accepted[~accepted["isbn"].isin(list(holds))]
+                    self._commit_batch(
+                        loans=opened if remaining.empty else pd.concat([remaining, opened], ignore_index=True),
+                        closed=accepted["isbn"],
+                        opened=opened,
+                        deltas=shelved.groupby("isbn").size(),
+                        user_ids=np.concatenate([accepted["user_id"].to_numpy(dtype="int64"), opened["user_id"].to_numpy(dtype="int64")]),
+                    )
+                self.logger.info(f"{len(accepted)} of {len(results)} book(s) returned.")
+                return results
+        except Exception as e:
+            self.logger.error(f"Error returning books: {e}")
+            raise e
+
+    def checkout_books(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to check out many books at once from a file or stdin, e.g. scanned at the desk
+
+        Args:
+            Takes input from the user
+            print_output (bool, optional): Whether to print the output. Defaults to True.
+
+        Returns:
+            Union[None, pd.DataFrame]: The outcome of every item if print_output is False
+        """
+        results = self.checkout_many(self._ask_for_batch(Checkout))
+        if not print_output:
+            return results
+        print(results)
+
+    def return_books(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to return many books at once from a file or stdin, e.g. scanned at the desk
+
+        Args:
+            Takes input from the user
+            print_output (bool, optional): Whether to print the output. Defaults to True.
+
+        Returns:
+            Union[None, pd.DataFrame]: The outcome of every item if print_output is False
+        """
+        results = self.return_many([returned.isbn for returned in self._ask_for_batch(Return)])
+        if not print_output:
+            return results
+        print(results)
+
     def update_checkout(self) -> None:
         """
         Function to update the checkout details in the storage
@@ -144,7 +600,7 @@ class CheckoutDB(DB):
             None
         """
         try:
-            checkout = Checkout(**self._ask_for_input(Checkout.model_fields))
+            checkout = Checkout(**self._ask_for_input(Checkout))
 
             # check if the book with the given isbn exists
             if not self.check_isbn(isbn=checkout.isbn):
@@ -175,7 +631,7 @@ class CheckoutDB(DB):
             Union[None, pd.DataFrame]: The search results if print_output is False
         """
         try:
-            checkout = Checkout(**self._ask_for_input(Checkout.model_fields))
+            checkout = Checkout(**self._ask_for_input(Checkout))
             
             # search the book in the storage based on the input if it exists based on isbn or user_id
             if checkout.isbn:
@@ -207,4 +663,97 @@ class CheckoutDB(DB):
             print(self._list(file_path=self.file_path))
         except Exception as e:
             self.logger.error(f"Error listing books in storage: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def overdue_loans(self, print_output: bool = True, now: Union[datetime, None] = None) -> Union[None, pd.DataFrame]:
+        """
+        Function to list the open loans that are past their due date
+
+        Args:
+            print_output (bool): Whether to print the output or not
+            now (Union[datetime, None]): The time to compare the due dates against. Defaults to now.
+
+        Returns:
+            Union[None, pd.DataFrame]: The overdue loans if print_output is False
+        """
+        try:
+            overdue = self._open_loans().iloc[self._open_indexes["due_date"].range(end=now or datetime.now())]
+
+            if not print_output:
+                return overdue
+            print(overdue)
+        except Exception as e:
+            self.logger.error(f"Error listing overdue loans in storage: {e}")
+            raise e
+
+    def loans_in_range(self, print_output: bool = True, start: Union[datetime, None] = None, end: Union[datetime, None] = None) -> Union[None, pd.DataFrame]:
+        """
+        Function to list the open and closed loans checked out in the given date range
+
+        Args:
+            print_output (bool): Whether to print the output or not
+            start (Union[datetime, None]): The inclusive start of the range. Asked from the user if not given.
+            end (Union[datetime, None]): The exclusive end of the range. Asked from the user if not given.
+
+        Returns:
+            Union[None, pd.DataFrame]: The loans in the range if print_output is False
+        """
+        try:
+            if start is None or end is None:
+                loan_range = LoanRange(start=input("Enter start (YYYY-MM-DD): "), end=input("Enter end (YYYY-MM-DD): "))
+                start, end = loan_range.start, loan_range.end
+
+            open_loans = self._open_loans().iloc[self._open_indexes["checkout_time"].range(start=start, end=end)]
+
+            history = self._loan_history()
+            closed_loans = history.iloc[self._history_index.range(start=start, end=end)]
+
+            loans = pd.concat([closed_loans, open_loans], ignore_index=True)
+            if not print_output:
+                return loans
+            print(loans)
+        except Exception as e:
+            self.logger.error(f"Error searching loans in storage: {e}")
+            raise e
+
+    def list_history(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to list the closed loans in the history storage
+
+        Args:
+            print_output (bool): Whether to print the output or not
+
+        Returns:
+            Union[None, pd.DataFrame]: The loan history if print_output is False
+        """
+        try:
+            if not print_output:
+                return self._loan_history().copy()
+            print(self._loan_history())
+        except Exception as e:
+            self.logger.error(f"Error listing loan history in storage: {e}")
+            raise e
+
+    def list_holds(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to list the holds waiting for books
+
+        Args:
+            print_output (bool): Whether to print the output or not
+
+        Returns:
+            Union[None, pd.DataFrame]: The list of holds if print_output is False
+        """
+        return self.holds_db.list_holds(print_output=print_output)
+
+    def table_specs(self) -> Dict[str, Tuple[str, Union[str, None], Dict[str, str]]]:
+        """
+        Function to describe the tables stored by this instance: the open loans and the loan history
+
+        Args:
+            None
+
+        Returns:
+            Dict[str, Tuple[str, Union[str, None], Dict[str, str]]]: The file path, primary key column and dtypes of each table
+        """
+        return {**super().table_specs(), self._table_name(self.history_file_path): (self.history_file_path, None, self.history_dtypes)}
\ No newline at end of file
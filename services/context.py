@@ -0,0 +1,166 @@
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, Type, TypeVar, Union
+import os
+import threading
+
+from services.changelog import ChangeLog, open_changelog
+from services.replica import Replica, open_replica
+from config.config import (
+    BOOKS_STORAGE_FILE_NAME, BOOKS_STORAGE_FILE_PATH, USERS_STORAGE_FILE_NAME, USERS_STORAGE_FILE_PATH,
+    CHECKOUT_STORAGE_FILE_NAME, CHECKOUT_STORAGE_FILE_PATH, HISTORY_STORAGE_FILE_NAME, HISTORY_STORAGE_FILE_PATH,
+    HOLDS_STORAGE_FILE_NAME, HOLDS_STORAGE_FILE_PATH, BOOKS_SHARDS, USERS_SHARDS, CHECKOUT_SHARDS, BOOKS_SNAPSHOT_READS,
+    RECORD_CACHE_SIZE, RECORD_CACHE_TTL, BLOOM_FILTER_ENABLED, BLOOM_FALSE_POSITIVE_RATE, CHANGELOG_ENABLED, CHANGELOG_FILE_PATH,
+    REPLICA_MODE, REPLICA_PRIMARY_PATH, REPLICA_CHANGELOG_FILE_PATH, REPLICA_MAX_STALENESS, LOAN_PERIOD_DAYS,
+    BACKUP_PATH, EXPORT_CHUNK_SIZE,
+)
+from config.log import db_logger
+
+Service = TypeVar("Service")
+
+class StorageContext():
+    """
+    Storage settings and registry of a process. It owns one service instance per table, so the
+    resident tables, record caches, Bloom filters and loan indexes of a table exist once and every
+    service of the process sees the writes of the others, and one lock per table serializes the
+    writes of its threads. Every setting defaults to config.config and can be overridden per process.
+    """
+    def __init__(
+        self,
+        books_file_path: str = os.path.join(BOOKS_STORAGE_FILE_PATH, BOOKS_STORAGE_FILE_NAME),
+        users_file_path: str = os.path.join(USERS_STORAGE_FILE_PATH, USERS_STORAGE_FILE_NAME),
+        checkout_file_path: str = os.path.join(CHECKOUT_STORAGE_FILE_PATH, CHECKOUT_STORAGE_FILE_NAME),
+        history_file_path: str = os.path.join(HISTORY_STORAGE_FILE_PATH, HISTORY_STORAGE_FILE_NAME),
+        holds_file_path: str = os.path.join(HOLDS_STORAGE_FILE_PATH, HOLDS_STORAGE_FILE_NAME),
+        books_shards: int = BOOKS_SHARDS,
+        users_shards: int = USERS_SHARDS,
+        checkout_shards: int = CHECKOUT_SHARDS,
+        books_snapshot_reads: bool = BOOKS_SNAPSHOT_READS,
+        record_cache_size: int = RECORD_CACHE_SIZE,
+        record_cache_ttl: Union[float, None] = RECORD_CACHE_TTL,
+        bloom_filter_enabled: bool = BLOOM_FILTER_ENABLED,
+        bloom_false_positive_rate: float = BLOOM_FALSE_POSITIVE_RATE,
+        changelog_enabled: bool = CHANGELOG_ENABLED,
+        changelog_file_path: str = CHANGELOG_FILE_PATH,
+        replica_mode: bool = REPLICA_MODE,
+        replica_primary_path: str = REPLICA_PRIMARY_PATH,
+        replica_changelog_file_path: str = REPLICA_CHANGELOG_FILE_PATH,
+        replica_max_staleness: float = REPLICA_MAX_STALENESS,
+        loan_period_days: int = LOAN_PERIOD_DAYS,
+        backup_path: str = BACKUP_PATH,
+        export_chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> None:
+        self.logger = db_logger.getChild("StorageContext")
+        self.books_file_path = books_file_path
+        self.users_file_path = users_file_path
+        self.checkout_file_path = checkout_file_path
+        self.history_file_path = history_file_path
+        self.holds_file_path = holds_file_path
+        self.books_shards = books_shards
+        self.users_shards = users_shards
+        self.checkout_shards = checkout_shards
+        self.books_snapshot_reads = books_snapshot_reads
+        self.record_cache_size = record_cache_size
+        self.record_cache_ttl = record_cache_ttl
+        self.bloom_filter_enabled = bloom_filter_enabled
+        self.bloom_false_positive_rate = bloom_false_positive_rate
+        self.changelog_file_path = changelog_file_path
+        self.replica_primary_path = replica_primary_path
+        self.loan_period_days = loan_period_days
+        self.backup_path = backup_path
+        self.export_chunk_size = export_chunk_size
+
+        # the change log and the replica are shared by every table of the process
+        self.changelog: Union[ChangeLog, None] = open_changelog(changelog_file_path) if changelog_enabled else None
+        self.replica: Union[Replica, None] = open_replica(changelog=open_changelog(replica_changelog_file_path), max_staleness=replica_max_staleness) if replica_mode else None
+
+        self._services: Dict[type, object] = {}
+
+        # one reentrant lock per table file, shared by every service and thread of the process
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+
+    @classmethod
+    def for_directory(cls, path: str, **settings) -> "StorageContext":
+        """
+        Function to build a context keeping every table and the change log in one directory, e.g. for a tool or a second library
+
+        Args:
+            path (str): The directory of the storage
+            **settings: Any other setting of the context
+
+        Returns:
+            StorageContext: The context
+        """
+        os.makedirs(path, exist_ok=True)
+        paths = {
+            "books_file_path": os.path.join(path, BOOKS_STORAGE_FILE_NAME),
+            "users_file_path": os.path.join(path, USERS_STORAGE_FILE_NAME),
+            "checkout_file_path": os.path.join(path, CHECKOUT_STORAGE_FILE_NAME),
+            "history_file_path": os.path.join(path, HISTORY_STORAGE_FILE_NAME),
+            "holds_file_path": os.path.join(path, HOLDS_STORAGE_FILE_NAME),
+            "changelog_file_path": os.path.join(path, os.path.basename(CHANGELOG_FILE_PATH)),
+            "backup_path": os.path.join(path, os.path.basename(BACKUP_PATH)),
+        }
+        return cls(**{**paths, **settings})
+
+    def instance(self, service: Type[Service]) -> Service:
+        """
+        Function to get the instance of a service (BooksDB, UsersDB, CheckoutDB, HoldsDB) of this context, building it on first use
+
+        Args:
+            service (Type[Service]): The service class
+
+        Returns:
+            Service: The only instance of the service in this context
+        """
+        if service not in self._services:
+            self._services[service] = service(context=self)
+            self.logger.info(f"{service.__name__} opened.")
+        return self._services[service]
+
+    def lock(self, file_path: str) -> threading.RLock:
+        """
+        Function to get the lock of a table, held by every write of the table in this context
+
+        Args:
+            file_path (str): The path of the table file
+
+        Returns:
+            threading.RLock: The lock of the table
+        """
+        with self._locks_guard:
+            return self._locks.setdefault(os.path.abspath(file_path), threading.RLock())
+
+    @contextmanager
+    def locked(self, *file_paths: str) -> Iterator[None]:
+        """
+        Function to hold the locks of one or many tables, e.g. around a read-modify-write spanning
+        several tables. The locks are always taken in the same order so two writers cannot deadlock.
+
+        Args:
+            *file_paths (str): The paths of the table files
+
+        Returns:
+            Iterator[None]: Holds the locks while the with block runs
+        """
+        with ExitStack() as stack:
+            for file_path in sorted({os.path.abspath(path) for path in file_paths}):
+                stack.enter_context(self.lock(file_path))
+            yield
+
+_default_context: Union[StorageContext, None] = None
+
+def default_context() -> StorageContext:
+    """
+    Function to get the context of services built without one, configured from config.config
+
+    Args:
+        None
+
+    Returns:
+        StorageContext: The default context of the process
+    """
+    global _default_context
+    if _default_context is None:
+        _default_context = StorageContext()
+    return _default_context
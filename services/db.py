@@ -1,74 +1,163 @@
-import typing
-from typing import Dict
+from typing import Callable, Dict, List, Tuple, Type, Union
 
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pydantic import BaseModel
-from pydantic.fields import FieldInfo
 
+import numpy as np
 import pandas as pd
 
+from services.schema import apply_dtypes, memory_usage
+from services.parsing import compile_parser, parse_batch
+from services.snapshot import Snapshot, write_snapshot
+from services.changelog import ChangeLog
+from services.replica import Replica
+from services.context import StorageContext, default_context
+from services.cache import RecordCache
+from services.bloom import CountingBloomFilter
+from services.shards import write_csv, shard_of, shard_paths, existing_paths, read_shard, validate_shard, summarize_shard, merge_shard, layout_path, read_layout, write_layout
 from config.log import db_logger
 
 class DB():
-    def __init__(self, columns) -> None:
+    def __init__(self, columns, dtypes: Union[Dict[str, str], None] = None, key_col: Union[str, None] = None, shards: int = 1, context: Union[StorageContext, None] = None) -> None:
+        # storage settings and the change log and replica shared by the services of the process
+        self.context = context or default_context()
         self.columns = columns
+        self.dtypes = dtypes or {}
+        self.key_col = key_col
+        self.shards = shards if key_col else 1
         self.logger = db_logger.getChild("DB")
 
-    def _ask_for_input(self, args: Dict[str, FieldInfo]) -> dict:
+        # resident, typed copy of the table owned by this instance with the signature of the file it was read from
+        self._tables: Dict[str, Tuple[Tuple[int, int], pd.DataFrame]] = {}
+
+        # validated records of hot keys with the table signature they are valid for, served without touching pandas
+        self.record_cache: Union[RecordCache, None] = RecordCache(maxsize=self.context.record_cache_size, ttl=self.context.record_cache_ttl) if key_col and self.context.record_cache_size > 0 else None
+        self._cache_signature = None
+
+        # memory mapped snapshot serving the reads of the owned table in read only processes
+        self.snapshot: Union[Snapshot, None] = None
+
+        # ordered feed of the mutations made through this instance, shared by every DB of the process
+        self.changelog: Union[ChangeLog, None] = self.context.changelog
+
+        # branch nodes serve the reads of keyed tables from a replica following the primary change log
+        self.replica: Union[Replica, None] = None
+        if self.context.replica is not None and self.key_col and hasattr(self, "file_path"):
+            self.replica = self.context.replica
+            self.replica.register(table=self._table_name(self.file_path), file_path=os.path.join(self.context.replica_primary_path, os.path.basename(self.file_path)), key_col=self.key_col, dtypes=self.dtypes)
+
+        # Bloom filter of the primary keys answering lookups of missing keys without reading the table,
+        # replicas already hold their tables in memory indexed by key
+        self.bloom: Union[CountingBloomFilter, None] = None
+        self._bloom_enabled = bool(self.context.bloom_filter_enabled and self.key_col and self.replica is None and hasattr(self, "file_path"))
+        self._no_rows = apply_dtypes(pd.DataFrame(columns=list(self.dtypes) or self.columns), self.dtypes) if self._bloom_enabled else None
+
+        # the layout recorded by the last reshard overrides the configured number of shards
+        self._layout_signature = None
+        if self.key_col and hasattr(self, "file_path"):
+            self.shards = read_layout(self.file_path) or self.shards
+
+    def _ask_for_input(self, model: Type[BaseModel]) -> dict:
         """
         Function to ask for input from the user based on the fields in the model
 
         Args:
-            args (Dict[str, FieldInfo]): The fields in the pydantic model
+            model (Type[BaseModel]): The pydantic model, its parser is compiled once and reused
 
         Returns:
             dict: The input from the user
         """
         try:
-            out = {}
-            # Ask for input for each field in the model
-            for key, val in args.items():
-
-                # Ask for input only if the field is required
-                if val.is_required():
-                    out[key] = input(f"Enter {key}: ")
-
-                    # Convert the input to the required type
-                    if isinstance(val.annotation, typing._UnionGenericAlias):
-                        for a in val.annotation.__args__:
-                            try:
-                                out[key] = a(out[key])
-                                break
-                            except Exception:
-                                continue
-                    elif not isinstance(val.annotation, str):
-                        out[key] = val.annotation(out[key])
-                    
-                    if out[key] == "":
-                        out[key] = None
-            return out
+            # Ask for input only for the required fields and convert it to the required types
+            names, parse = compile_parser(model)
+            return parse([input(f"Enter {name}: ") for name in names])
         except Exception as e:
             self.logger.error(f"Error asking for input: {e}")
             raise e
 
-    def _load(self, file_path: str) -> pd.DataFrame:
+    def _ask_for_batch(self, model: Type[BaseModel]) -> List[BaseModel]:
         """
-        Function to load data from a file
+        Function to read many records at once from a file or from stdin, e.g. from a barcode scanner
+
+        Args:
+            model (Type[BaseModel]): The pydantic model of a record
+
+        Returns:
+            List[BaseModel]: The valid records, invalid lines are logged and skipped
+        """
+        try:
+            names, _ = compile_parser(model, required_only=False)
+            source = input(f"Enter path of the file with one '{','.join(names)}' record per line (- for stdin): ")
+            if source == "-":
+                records, errors = parse_batch(model, sys.stdin)
+            else:
+                with open(source, newline="") as f:
+                    records, errors = parse_batch(model, f)
+
+            for line_no, error in errors:
+                self.logger.warning(f"Skipping line {line_no}: {error}")
+            return records
+        except Exception as e:
+            self.logger.error(f"Error reading batch input: {e}")
+            raise e
+
+    def _load(self, file_path: str, dtypes: Union[Dict[str, str], None] = None) -> pd.DataFrame:
+        """
+        Function to load data from a file. The table owned by this instance is kept resident
+        and only read again when the file was changed by another writer, the returned frame may be
+        that resident copy and must be treated as read only: copy it before changing it.
 
         Args:
             file_path (str): The path to the file
+            dtypes (Union[Dict[str, str], None], optional): The schema of the storage. Defaults to the schema of the table.
 
         Returns:
             pd.DataFrame: The data loaded from the file
         """
         try:
-            if os.path.exists(file_path):
-                return pd.read_csv(file_path)
-            else:
-                return pd.DataFrame(columns=self.columns)
+            if file_path == getattr(self, "file_path", None):
+                if self.replica is not None:
+                    return self.replica.table(self._table_name(file_path))
+                if self.snapshot is not None:
+                    return self.snapshot.to_frame()
+                self._check_layout()
+                if self.shards > 1:
+                    # categories differ between the shards, the concatenated columns are converted back
+                    return apply_dtypes(pd.concat([self._read(path) for path in self._shard_files()], ignore_index=True), self.dtypes)
+            return self._read(file_path=file_path, dtypes=dtypes)
         except Exception as e:
             self.logger.error(f"Error loading data from file {file_path}")
             raise e
+
+    def _read(self, file_path: str, dtypes: Union[Dict[str, str], None] = None) -> pd.DataFrame:
+        """
+        Function to read a single table or shard file, served from the resident copy if it did not change.
+        The resident copy itself is returned and must not be changed by the caller.
+
+        Args:
+            file_path (str): The path to the file
+            dtypes (Union[Dict[str, str], None], optional): The schema of the storage. Defaults to the schema of the table.
+
+        Returns:
+            pd.DataFrame: The data read from the file
+        """
+        resident = self._owns(file_path)
+        signature = self._signature(file_path)
+        if resident and file_path in self._tables and self._tables[file_path][0] == signature:
+            return self._tables[file_path][1]
+
+        dtypes = self.dtypes if dtypes is None else dtypes
+        if os.path.exists(file_path):
+            df = pd.read_csv(file_path)
+        else:
+            df = pd.DataFrame(columns=list(dtypes) or self.columns)
+        df = apply_dtypes(df, dtypes)
+
+        if resident:
+            self._tables[file_path] = (signature, df)
+        return df
         
     def _add(self, file_path: str, data: BaseModel) -> None:
         """
@@ -82,20 +171,107 @@ class DB():
             None
         """
         try:
-            df = self._load(file_path=file_path)
+            with self.context.locked(file_path):
+                # only the shard owning the key is read and rewritten
+                logical_path = file_path
+                file_path = self._targets(file_path=file_path, key=self.key_col, val=getattr(data, str(self.key_col), None))[0]
+                df = self._read(file_path=file_path)
+                fresh = self._cache_fresh(file_path=logical_path)
+                bloom = self._fresh_filter() if logical_path == getattr(self, "file_path", None) else None
 
-            # convert the data to a DataFrame object
-            new_data = data.model_dump()
-            new_data = {k: [v] for k, v in new_data.items()}
-            new_data = pd.DataFrame(new_data)
+                # convert the data to a DataFrame object
+                new_data = data.model_dump()
+                new_data = {k: [v] for k, v in new_data.items()}
+                new_data = apply_dtypes(pd.DataFrame(new_data), self.dtypes)
 
-            # add the data to the storage
-            df = pd.concat([df, new_data], ignore_index=True)
-            df.to_csv(file_path, index=False)
+                # add the data to the storage
+                df = new_data if df.empty else pd.concat([df, new_data], ignore_index=True)
+                self._write(file_path=file_path, df=df)
+                self._invalidate(file_path=logical_path, key=getattr(data, str(self.key_col), None), fresh=fresh)
+                self._track_keys(bloom=bloom, added=new_data[self.key_col] if self.key_col else None)
+                self._emit(file_path=logical_path, op="insert", key=getattr(data, str(self.key_col), None), values=data.model_dump(mode="json"))
         except Exception as e:
             self.logger.error(f"Error adding data to storage: {e}")
             raise e
 
+    def _store(self, file_path: str, df: pd.DataFrame) -> None:
+        """
+        Function to write a whole table to the storage, splitting it over the shards if the table is sharded
+
+        Args:
+            file_path (str): The path to the file
+            df (pd.DataFrame): The data to be written
+
+        Returns:
+            None
+        """
+        with self.context.locked(file_path):
+            # the keys the table had before the write, read from the resident copy while the filter is in step with it
+            bloom = self._fresh_filter() if file_path == getattr(self, "file_path", None) else None
+            before = self._load(file_path=file_path)[self.key_col] if bloom is not None else None
+
+            if file_path != getattr(self, "file_path", None) or self.shards <= 1:
+                self._write(file_path=file_path, df=df)
+            else:
+                shard = shard_of(df[self.key_col], self.shards) if not df.empty else pd.Series(dtype="int64")
+                for i, path in enumerate(self._shard_files()):
+                    self._write(file_path=path, df=df[shard == i])
+            self._track_keys(bloom=bloom, added=df[self.key_col] if bloom is not None else None, removed=before)
+
+    def _write(self, file_path: str, df: pd.DataFrame) -> None:
+        """
+        Function to write a single table or shard file and refresh its resident copy
+
+        Args:
+            file_path (str): The path to the file
+            df (pd.DataFrame): The data to be written
+
+        Returns:
+            None
+        """
+        self._check_writable(file_path=file_path)
+        write_csv(df, file_path)
+        if self._owns(file_path):
+            self._tables[file_path] = (self._signature(file_path), apply_dtypes(df, self.dtypes))
+
+    def _append(self, file_path: str, data: BaseModel) -> None:
+        """
+        Function to append data to an append-only storage without reading it back
+
+        Args:
+            file_path (str): The path to the file
+            data (BaseModel): The pydantic data model to be appended
+
+        Returns:
+            None
+        """
+        self._append_many(file_path=file_path, data=[data])
+
+    def _append_many(self, file_path: str, data: List[BaseModel]) -> None:
+        """
+        Function to append many records to an append-only storage with a single write
+
+        Args:
+            file_path (str): The path to the file
+            data (List[BaseModel]): The pydantic data models to be appended, in order
+
+        Returns:
+            None
+        """
+        try:
+            with self.context.locked(file_path):
+                if not data:
+                    return
+                self._check_writable(file_path=file_path)
+                new_data = pd.DataFrame([record.model_dump() for record in data])
+                new_data.to_csv(file_path, mode="a", index=False, header=not os.path.exists(file_path))
+                self._tables.pop(file_path, None)
+                for record in data:
+                    self._emit(file_path=file_path, op="append", values=record.model_dump(mode="json"))
+        except Exception as e:
+            self.logger.error(f"Error appending data to storage: {e}")
+            raise e
+
     def _delete(self, file_path: str, data: BaseModel) -> None:
         """
         Function to delete data from the storage
@@ -108,19 +284,31 @@ class DB():
             None
         """
         try:
-            # load the data from the storage
-            df = self._load(file_path=file_path)
-            
-            # delete the data from the storage if it exists in the storage
-            if not df.empty:
+            with self.context.locked(file_path):
                 data = data.model_dump()
                 key = list(data.keys())[0]
                 val = data[key]
-                df = df[df[key] != val]
-                df.to_csv(file_path, index=False)
-            else:
-                self.logger.warning(f"Storage is empty, did not delete anything: {data}")
-                return
+
+                # delete the data from the storage if it exists in the storage, touching only the shards that can hold the key
+                fresh = self._cache_fresh(file_path=file_path)
+                bloom = self._fresh_filter() if file_path == getattr(self, "file_path", None) else None
+                empty = True
+                removed = []
+                for path in self._targets(file_path=file_path, key=key, val=val):
+                    df = self._read(file_path=path)
+                    if df.empty:
+                        continue
+                    empty = False
+                    if bloom is not None:
+                        removed.append(df.loc[df[key] == val, self.key_col])
+                    self._write(file_path=path, df=df[df[key] != val])
+
+                if empty:
+                    self.logger.warning(f"Storage is empty, did not delete anything: {data}")
+                    return
+                self._invalidate(file_path=file_path, key=val if key == self.key_col else None, fresh=fresh)
+                self._track_keys(bloom=bloom, removed=pd.concat(removed) if removed else None)
+                self._emit(file_path=file_path, op="delete", key=val if key == self.key_col else None, values={key: val})
 
         except Exception as e:
             self.logger.error(f"Error removing data from storage: {e}")
@@ -139,25 +327,40 @@ class DB():
             None
         """
         try:
-            # load the data from the storage
-            df = self._load(file_path=file_path)
-            
-            # update the data in the storage if it exists in the storage
-            if not df.empty:
+            with self.context.locked(file_path):
                 data = data.model_dump()
                 primary_key_val = data[key_col]
 
-                # update the data in the storage if it exists in the storage and is not None 
-                # for each key in the data
-                for key, val in data.items():
-                    if key == key_col:
+                # update the data in the storage, touching only the shards that can hold the key
+                fresh = self._cache_fresh(file_path=file_path)
+                rekeyed = key_col != self.key_col and data.get(str(self.key_col)) is not None
+                bloom = self._fresh_filter() if file_path == getattr(self, "file_path", None) and not rekeyed else None
+                empty = True
+                for path in self._targets(file_path=file_path, key=key_col, val=primary_key_val):
+                    # the resident copy is left untouched until the write succeeds
+                    df = self._read(file_path=path).copy()
+                    if df.empty:
                         continue
+                    empty = False
 
-                    if val is not None:
-                        df.loc[df[key_col] == primary_key_val, key] = val
-                df.to_csv(file_path, index=False)
-            else:
-                self.logger.error(f"Storage is empty, did not update anything: {data}")
+                    # update the data in the storage if it exists in the storage and is not None 
+                    # for each key in the data
+                    for key, val in data.items():
+                        if key == key_col:
+                            continue
+
+                        if val is not None:
+                            if isinstance(df[key].dtype, pd.CategoricalDtype) and val not in df[key].cat.categories:
+                                df[key] = df[key].cat.add_categories([val])
+                            df.loc[df[key_col] == primary_key_val, key] = val
+                    self._write(file_path=path, df=df)
+
+                if empty:
+                    self.logger.error(f"Storage is empty, did not update anything: {data}")
+                else:
+                    self._invalidate(file_path=file_path, key=primary_key_val if key_col == self.key_col else None, fresh=fresh)
+                    self._track_keys(bloom=bloom)
+                    self._emit(file_path=file_path, op="update", key=primary_key_val, values={k: v for k, v in data.items() if v is not None})
 
         except Exception as e:
             self.logger.error(f"Error updating data in storage: {e}")
@@ -176,15 +379,32 @@ class DB():
             pd.DataFrame: The data that was found
         """
         try:
+            # reads on a branch node are served by the replica
+            if self.replica is not None and file_path == getattr(self, "file_path", None):
+                return self.replica.search(table=self._table_name(file_path), key=key, val=val)
+
+            # keys missing from the Bloom filter are guaranteed not to be in the table
+            if key == self.key_col and file_path == getattr(self, "file_path", None) and isinstance(val, (int, np.integer)):
+                bloom = self._key_filter()
+                if bloom is not None and val not in bloom:
+                    return self._no_rows.copy()
+
+            # key lookups on a snapshot bisect the mapped file instead of loading the table
+            if self.snapshot is not None and file_path == getattr(self, "file_path", None) and key == self.snapshot.key_col:
+                return self.snapshot.search(val)
+
+            # key lookups on a sharded table only read the shard owning the key
+            targets = self._targets(file_path=file_path, key=key, val=val)
+
             # load the data from the storage
-            df = self._load(file_path=file_path)
+            df = self._read(file_path=targets[0]) if targets != [file_path] and len(targets) == 1 else self._load(file_path=file_path)
 
             # search for the data in the storage if it exists in the storage
             if not df.empty:
                 return df[df[key] == val]
             else:
                 self.logger.warning("Storage is empty, did not find anything")
-                return pd.DataFrame(columns=df.columns)
+                return df.iloc[0:0]
         except Exception as e:
             self.logger.error(f"Error searching data in storage: {e}")
             raise e
@@ -197,10 +417,549 @@ class DB():
             file_path (str): The path to the file
 
         Returns:
-            pd.DataFrame: The data in the storage
+            pd.DataFrame: A copy of the data in the storage, callers cannot change the resident table through it
         """
         try:
-            return self._load(file_path=file_path)
+            return self._load(file_path=file_path).copy()
         except Exception as e:
             self.logger.error(f"Error listing data in storage: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def _records(self, df: pd.DataFrame) -> List[dict]:
+        """
+        Function to convert a DataFrame to a list of records with missing values as None
+
+        Args:
+            df (pd.DataFrame): The data to convert
+
+        Returns:
+            List[dict]: The records, ready to be passed to a pydantic model
+        """
+        return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+    def _record(self, model: Type[BaseModel], key) -> Union[BaseModel, None]:
+        """
+        Function to get a validated record of the owned table by primary key, read through the record cache
+
+        Args:
+            model (Type[BaseModel]): The pydantic model of the record
+            key: The primary key of the record
+
+        Returns:
+            Union[BaseModel, None]: A copy of the record the caller is free to modify, None if the key does not exist
+        """
+        if self.record_cache is not None:
+            # another writer changed the table, none of the cached records can be trusted
+            signature = self._signature(self.file_path)
+            if signature != self._cache_signature:
+                self.record_cache.clear()
+                self._cache_signature = signature
+
+            record = self.record_cache.get(key)
+            if type(record) is model:
+                return record.model_copy()
+
+        rows = self._records(self._search(file_path=self.file_path, key=self.key_col, val=key))
+        if not rows:
+            return None
+        record = model(**rows[0])
+        if self.record_cache is not None:
+            self.record_cache.put(key, record)
+        return record.model_copy()
+
+    def _cache_fresh(self, file_path: str) -> bool:
+        """
+        Function to check, before a write, that the record cache reflects the current table
+
+        Args:
+            file_path (str): The path of the table about to be written
+
+        Returns:
+            bool: True if the cached records are valid for the table as it is now
+        """
+        return self.record_cache is not None and file_path == self.file_path and self._cache_signature == self._signature(file_path)
+
+    def _invalidate(self, file_path: str, key, fresh: bool) -> None:
+        """
+        Function to drop the records changed by a write from the record cache
+
+        Args:
+            file_path (str): The path of the table that was written
+            key: The primary key of the changed record, None if any record may have changed
+            fresh (bool): Whether the cache was valid for the table right before the write
+
+        Returns:
+            None
+        """
+        if self.record_cache is None or file_path != self.file_path:
+            return
+        if key is None:
+            self.record_cache.clear()
+        else:
+            self.record_cache.invalidate(key)
+
+        # the other cached records are still valid for the table as this process just wrote it
+        if fresh:
+            self._cache_signature = self._signature(file_path)
+
+    def cache_stats(self) -> Union[Dict[str, Union[int, float]], None]:
+        """
+        Function to report the size and hit rate of the record cache
+
+        Args:
+            None
+
+        Returns:
+            Union[Dict[str, Union[int, float]], None]: The cache statistics, None if the table has no record cache
+        """
+        return self.record_cache.stats() if self.record_cache is not None else None
+
+    def _bloom_path(self) -> str:
+        """
+        Function to get the path of the Bloom filter of the owned table, stored beside the table file
+
+        Args:
+            None
+
+        Returns:
+            str: The path of the filter file
+        """
+        return f"{os.path.splitext(self.file_path)[0]}.bloom.npz"
+
+    def _key_filter(self) -> Union[CountingBloomFilter, None]:
+        """
+        Function to get the Bloom filter of the primary keys, loading it from disk or rebuilding it
+        from the table when it was built for another version of the table or is over capacity
+
+        Args:
+            None
+
+        Returns:
+            Union[CountingBloomFilter, None]: The filter, None if Bloom filters are disabled
+        """
+        if not self._bloom_enabled:
+            return None
+        bloom = self._fresh_filter()
+        if bloom is not None and len(bloom) <= bloom.capacity:
+            return bloom
+
+        keys = self._load(file_path=self.file_path)[self.key_col].dropna().to_numpy(dtype="int64")
+        bloom = CountingBloomFilter.build(keys=keys, capacity=max(2 * len(keys), 1024), error_rate=self.context.bloom_false_positive_rate)
+        bloom.signature = self._signature(self.file_path)
+        self._save_filter(bloom)
+        self.logger.info(f"Bloom filter of {self._table_name(self.file_path)} rebuilt for {len(keys)} keys.")
+        self.bloom = bloom
+        return bloom
+
+    def _fresh_filter(self) -> Union[CountingBloomFilter, None]:
+        """
+        Function to get the Bloom filter if it was built for the current version of the table, from
+        memory or from disk, without rebuilding it
+
+        Args:
+            None
+
+        Returns:
+            Union[CountingBloomFilter, None]: The filter, None if it is disabled, missing or stale
+        """
+        if not self._bloom_enabled:
+            return None
+        signature = self._signature(self.file_path)
+        if self.bloom is None or self.bloom.signature != signature:
+            bloom = CountingBloomFilter.load(self._bloom_path())
+            if bloom is None or bloom.signature != signature:
+                return None
+            self.bloom = bloom
+        return self.bloom
+
+    def _track_keys(self, bloom: Union[CountingBloomFilter, None], added: Union[pd.Series, None] = None, removed: Union[pd.Series, None] = None) -> None:
+        """
+        Function to keep the Bloom filter in step with a write made by this process, only the keys
+        whose number of rows changed are added or removed
+
+        Args:
+            bloom (Union[CountingBloomFilter, None]): The filter if it was fresh right before the write, None otherwise
+            added (Union[pd.Series, None], optional): The primary keys of the rows written. Defaults to None.
+            removed (Union[pd.Series, None], optional): The primary keys of the rows replaced or dropped. Defaults to None.
+
+        Returns:
+            None
+        """
+        # a filter that was already stale, e.g. after a write by another process, is rebuilt on the next lookup
+        if bloom is None:
+            return
+
+        empty = pd.Series(dtype="int64")
+        delta = (added if added is not None else empty).dropna().value_counts().sub((removed if removed is not None else empty).dropna().value_counts(), fill_value=0)
+        keys = delta.index.to_numpy(dtype="int64")
+        counts = delta.to_numpy(dtype="int64")
+        bloom.update(added=np.repeat(keys, np.clip(counts, 0, None)), removed=np.repeat(keys, np.clip(-counts, 0, None)))
+        bloom.signature = self._signature(self.file_path)
+        self._save_filter(bloom)
+
+    def _save_filter(self, bloom: CountingBloomFilter) -> None:
+        """
+        Function to persist the Bloom filter, read only processes keep using their copy in memory
+
+        Args:
+            bloom (CountingBloomFilter): The filter
+
+        Returns:
+            None
+        """
+        try:
+            bloom.save(self._bloom_path())
+        except OSError as e:
+            self.logger.warning(f"Could not persist Bloom filter: {e}")
+
+    def _signature(self, file_path: str) -> Tuple[int, int]:
+        """
+        Function to get a cheap signature of a file to detect changes made by other writers
+
+        Args:
+            file_path (str): The path to the file
+
+        Returns:
+            Tuple[int, int]: The modification time in nanoseconds and the size of the file, summed over the shards of a sharded table
+        """
+        if file_path == getattr(self, "file_path", None) and self.replica is not None:
+            return (self.replica.applied_seq, 0)
+        if file_path == getattr(self, "file_path", None) and self.shards > 1:
+            signatures = [self._signature(path) for path in self._shard_files()]
+            return (sum(s[0] for s in signatures), sum(s[1] for s in signatures))
+        if not os.path.exists(file_path):
+            return (0, 0)
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def memory_report(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to report the memory used by the resident copy of the table
+
+        Args:
+            print_output (bool, optional): Whether to print the output. Defaults to True.
+
+        Returns:
+            Union[None, pd.DataFrame]: The dtype and bytes used by each column if print_output is False
+        """
+        try:
+            report = memory_usage(self._load(file_path=self.file_path))
+            if not print_output:
+                return report
+            print(report)
+            if self.record_cache is not None:
+                print(f"Record cache: {self.cache_stats()}")
+        except Exception as e:
+            self.logger.error(f"Error reporting memory usage: {e}")
+            raise e
+
+    def _snapshot_path(self, file_path: str) -> str:
+        """
+        Function to get the path of the snapshot written beside a table file
+
+        Args:
+            file_path (str): The path to the file
+
+        Returns:
+            str: The path of the snapshot file
+        """
+        return f"{os.path.splitext(file_path)[0]}.snapshot.npy"
+
+    def _check_writable(self, file_path: str) -> None:
+        """
+        Function to refuse writes to a table that is served from a read only snapshot
+
+        Args:
+            file_path (str): The path to the file
+
+        Returns:
+            None
+        """
+        if self.snapshot is not None and self._owns(file_path):
+            raise PermissionError(f"Storage {file_path} is opened read only from a snapshot")
+        if self.replica is not None and self._owns(file_path):
+            raise PermissionError(f"Storage {file_path} is a read only replica, write to the primary instead")
+
+    def _write_snapshot(self, file_path: str, key_col: str) -> None:
+        """
+        Function to write a memory mappable snapshot of a table sorted on its key
+
+        Args:
+            file_path (str): The path to the file
+            key_col (str): The primary key column
+
+        Returns:
+            None
+        """
+        try:
+            write_snapshot(df=self._load(file_path=file_path), file_path=self._snapshot_path(file_path), key_col=key_col, dtypes=self.dtypes)
+            self.logger.info(f"Snapshot written to {self._snapshot_path(file_path)}")
+        except Exception as e:
+            self.logger.error(f"Error writing snapshot of {file_path}: {e}")
+            raise e
+
+    def _open_snapshot(self, file_path: str, key_col: str) -> None:
+        """
+        Function to serve the reads of a table from its memory mapped snapshot
+
+        Args:
+            file_path (str): The path to the file
+            key_col (str): The primary key column the snapshot is sorted on
+
+        Returns:
+            None
+        """
+        try:
+            if not os.path.exists(self._snapshot_path(file_path)):
+                raise FileNotFoundError(f"No snapshot found for {file_path}")
+            self.snapshot = Snapshot(file_path=self._snapshot_path(file_path), key_col=key_col, dtypes=self.dtypes)
+        except Exception as e:
+            self.logger.error(f"Error opening snapshot of {file_path}: {e}")
+            raise e
+
+    def _shard_files(self) -> List[str]:
+        """
+        Function to get the files of the table owned by this instance
+
+        Args:
+            None
+
+        Returns:
+            List[str]: The path of each shard, the table file itself when it is not sharded
+        """
+        return shard_paths(self.file_path, self.shards) if hasattr(self, "file_path") else []
+
+    def _check_layout(self) -> None:
+        """
+        Function to follow the recorded shard layout of the owned table, which another process may have
+        changed, and to refuse to serve a table whose files were written with another layout
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self.replica is not None or self.snapshot is not None or not self.key_col:
+            return
+
+        # files are only created, replaced or removed through a rename, which changes the directory
+        directory = os.path.dirname(self.file_path) or "."
+        stamp = (os.stat(directory).st_mtime_ns if os.path.isdir(directory) else 0, self._signature(layout_path(self.file_path)))
+        if stamp == self._layout_signature:
+            return
+
+        shards = read_layout(self.file_path)
+        if shards is not None and shards != self.shards:
+            self.logger.info(f"Table {self.file_path} is stored in {shards} shard(s), following its recorded layout.")
+            self.shards = shards
+            self._tables = {}
+
+        # files of another layout mean the number of shards is wrong, reading on would silently miss their rows
+        stray = sorted(set(existing_paths(self.file_path)) - set(self._shard_files()))
+        if stray:
+            raise FileNotFoundError(f"Storage {self.file_path} is expected in {self.shards} shard(s) but rows are stored in {', '.join(stray)}, reshard it or configure the matching number of shards")
+        self._layout_signature = stamp
+
+    def _owns(self, file_path: str) -> bool:
+        """
+        Function to check if a file holds rows of the table owned by this instance
+
+        Args:
+            file_path (str): The path to the file
+
+        Returns:
+            bool: True if the file is the table file or one of its shards
+        """
+        return file_path in self._shard_files()
+
+    def _targets(self, file_path: str, key: Union[str, None], val) -> List[str]:
+        """
+        Function to get the files that can hold the rows where key == val
+
+        Args:
+            file_path (str): The path to the file
+            key (Union[str, None]): The column that is matched
+            val: The value that is matched
+
+        Returns:
+            List[str]: The single shard owning val if key is the primary key of a sharded table, every file otherwise
+        """
+        if file_path != getattr(self, "file_path", None):
+            return [file_path]
+
+        self._check_layout()
+        paths = self._shard_files()
+        if self.shards > 1 and key == self.key_col and val is not None:
+            return [paths[shard_of(val, self.shards)]]
+        return paths
+
+    def _map_shards(self, func: Callable, jobs: List[tuple]) -> list:
+        """
+        Function to run a bulk operation over the shards, one shard per worker process
+
+        Args:
+            func (Callable): A module level function taking the arguments of one job
+            jobs (List[tuple]): The arguments of each job, usually one per shard
+
+        Returns:
+            list: The result of each job, in the order of the jobs
+        """
+        if len(jobs) <= 1:
+            return [func(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+            return list(pool.map(func, *zip(*jobs)))
+
+    def _validate(self, file_path: str, model: Type[BaseModel]) -> pd.DataFrame:
+        """
+        Function to validate every row of a table against its pydantic model, in parallel over the shards
+
+        Args:
+            file_path (str): The path to the file
+            model (Type[BaseModel]): The pydantic model of a row
+
+        Returns:
+            pd.DataFrame: The shard, key and error of every invalid row
+        """
+        try:
+            results = self._map_shards(validate_shard, [(path, self.dtypes, model, self.key_col) for path in self._targets(file_path=file_path, key=None, val=None)])
+            return pd.concat(results, ignore_index=True)
+        except Exception as e:
+            self.logger.error(f"Error validating data in storage: {e}")
+            raise e
+
+    def _summarize(self, file_path: str, group_col: Union[str, None] = None) -> pd.DataFrame:
+        """
+        Function to compute the row count and numeric totals of a table, in parallel over the shards
+
+        Args:
+            file_path (str): The path to the file
+            group_col (Union[str, None], optional): The column to group the totals by. Defaults to None.
+
+        Returns:
+            pd.DataFrame: The totals merged across the shards
+        """
+        try:
+            results = self._map_shards(summarize_shard, [(path, self.dtypes, group_col) for path in self._targets(file_path=file_path, key=None, val=None)])
+            report = pd.concat(results)
+            return report.sum().to_frame().T if group_col is None else report.groupby(level=0, observed=True).sum()
+        except Exception as e:
+            self.logger.error(f"Error summarizing data in storage: {e}")
+            raise e
+
+    def _import(self, file_path: str, source_path: str) -> int:
+        """
+        Function to upsert the rows of a CSV file into a table, merging each shard in its own worker process
+
+        Args:
+            file_path (str): The path to the file
+            source_path (str): The path of the CSV file to import
+
+        Returns:
+            int: The number of rows in the table after the import
+        """
+        try:
+            with self.context.locked(file_path):
+                self._check_writable(file_path=file_path)
+                rows = apply_dtypes(pd.read_csv(source_path), self.dtypes)
+                paths = self._targets(file_path=file_path, key=None, val=None)
+                shard = shard_of(rows[self.key_col], len(paths)) if len(paths) > 1 else pd.Series(0, index=rows.index)
+
+                jobs = [(path, self.dtypes, self.key_col, rows[shard == i]) for i, path in enumerate(paths)]
+                total = sum(self._map_shards(merge_shard, jobs))
+                for record in self._records(rows):
+                    self._emit(file_path=file_path, op="upsert", key=record[self.key_col], values=record)
+                return total
+        except Exception as e:
+            self.logger.error(f"Error importing data into storage: {e}")
+            raise e
+
+    def _reshard(self, file_path: str, shards: int) -> None:
+        """
+        Function to redistribute a table over a new number of shards, reading the old layout in parallel
+
+        Args:
+            file_path (str): The path to the file
+            shards (int): The new number of shards
+
+        Returns:
+            None
+        """
+        try:
+            with self.context.locked(file_path):
+                self._check_writable(file_path=file_path)
+                bloom = self._fresh_filter() if file_path == getattr(self, "file_path", None) else None
+                old_paths = existing_paths(file_path)
+                frames = self._map_shards(read_shard, [(path, self.dtypes) for path in old_paths])
+                df = pd.concat(frames, ignore_index=True) if frames else self._read(file_path=file_path)
+
+                self.shards = shards
+                self._tables = {}
+                self._store(file_path=file_path, df=df)
+
+                # drop the files of the old layout that are not part of the new one and record the new layout
+                for path in set(old_paths) - set(self._shard_files()):
+                    os.remove(path)
+                write_layout(file_path, shards)
+                self._layout_signature = self._signature(layout_path(file_path))
+                self._track_keys(bloom=bloom)
+                self.logger.info(f"Table {file_path} redistributed over {shards} shard(s).")
+        except Exception as e:
+            self.logger.error(f"Error resharding storage: {e}")
+            raise e
+
+    def _emit(self, file_path: str, op: str, key=None, values: Union[dict, None] = None) -> None:
+        """
+        Function to publish a mutation of a table to the change log
+
+        Args:
+            file_path (str): The path of the table file, its name is the table name in the log
+            op (str): The operation: insert, update, delete, append or upsert
+            key (optional): The primary key of the changed row. Defaults to None.
+            values (Union[dict, None], optional): The new values, or the matched values for a delete. Defaults to None.
+
+        Returns:
+            None
+        """
+        if self.changelog is None:
+            return
+        # numpy scalars coming from the tables are stored as plain JSON values
+        key = key.item() if hasattr(key, "item") else key
+        values = {k: v.item() if hasattr(v, "item") else v for k, v in (values or {}).items()}
+        self.changelog.append(table=self._table_name(file_path), op=op, key=key, values=values)
+
+    def _table_name(self, file_path: str) -> str:
+        """
+        Function to get the name of a table from its file, e.g. books for assets/books.csv
+
+        Args:
+            file_path (str): The path of the table file
+
+        Returns:
+            str: The table name
+        """
+        return os.path.splitext(os.path.basename(file_path))[0]
+
+    def table_specs(self) -> Dict[str, Tuple[str, Union[str, None], Dict[str, str]]]:
+        """
+        Function to describe the tables stored by this instance, e.g. for backups
+
+        Args:
+            None
+
+        Returns:
+            Dict[str, Tuple[str, Union[str, None], Dict[str, str]]]: The file path, primary key column and dtypes of each table
+        """
+        return {self._table_name(self.file_path): (self.file_path, self.key_col, self.dtypes)}
+
+    def table_shards(self) -> Dict[str, int]:
+        """
+        Function to get the number of shards of the table owned by this instance, e.g. for exports
+
+        Args:
+            None
+
+        Returns:
+            Dict[str, int]: The number of shards of the table
+        """
+        return {self._table_name(self.file_path): self.shards}
\ No newline at end of file
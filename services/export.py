@@ -0,0 +1,206 @@
+from typing import Any, Dict, Iterator, List, Tuple, Union
+import operator
+import os
+import re
+
+import pandas as pd
+
+from services.context import StorageContext, default_context
+from services.parsing import parse_bool
+from services.schema import apply_dtypes
+from services.shards import existing_paths, read_layout, shard_of, shard_paths
+from config.log import db_logger
+
+_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+_FILTER_PATTERN = re.compile(r"^\s*(\w+)\s*(==|!=|>=|<=|=|>|<)\s*(.*?)\s*$")
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+class Exporter():
+    """
+    Streaming export of the tables. Table files are read in chunks of chunksize rows, the filters are
+    applied to each chunk before it is converted any further and the matching rows are appended to the
+    output, so memory use does not grow with the size of the table.
+    """
+    def __init__(self, tables: Dict[str, Tuple[str, Union[str, None], Dict[str, str]]], chunksize: Union[int, None] = None, shards: Union[Dict[str, int], None] = None, context: Union[StorageContext, None] = None) -> None:
+        context = context or default_context()
+        self.tables = tables
+        self.chunksize = chunksize or context.export_chunk_size
+
+        # configured number of shards of each table, a table without one is never pruned to a single shard
+        self.shards = shards or {}
+        self.logger = db_logger.getChild("Exporter")
+
+    @staticmethod
+    def parse_filters(text: str, dtypes: Dict[str, str]) -> List[Tuple[str, str, Any]]:
+        """
+        Function to parse filters typed by the user, e.g. "author=Tolkien, availability>0"
+
+        Args:
+            text (str): Comma separated conditions of the form column operator value
+            dtypes (Dict[str, str]): The schema dtypes of the table, used to convert the values
+
+        Returns:
+            List[Tuple[str, str, Any]]: The column, operator and value of each condition
+        """
+        filters = []
+        for condition in filter(str.strip, text.split(",")):
+            match = _FILTER_PATTERN.match(condition)
+            if match is None or match.group(1) not in dtypes:
+                raise ValueError(f"Invalid filter: {condition.strip()}")
+            col, op, raw = match.groups()
+            dtype = dtypes[col]
+            if dtype in ("int64", "Int64"):
+                val = int(raw)
+            elif dtype in ("bool", "boolean"):
+                val = parse_bool(raw)
+            elif dtype == "datetime64[ns]":
+                val = pd.Timestamp(raw)
+            else:
+                val = raw
+            filters.append((col, op, val))
+        return filters
+
+    def _paths(self, file_path: str, key_col: Union[str, None], filters: List[Tuple[str, str, Any]], shards: Union[int, None] = None) -> List[str]:
+        """
+        Function to get the files that can hold matching rows, an equality filter on the key of a sharded table reads one shard
+
+        Args:
+            file_path (str): The path of the table file
+            key_col (Union[str, None]): The primary key column
+            filters (List[Tuple[str, str, Any]]): The filters
+            shards (Union[int, None], optional): The configured number of shards of the table, every file is read if it is unknown. Defaults to None.
+
+        Returns:
+            List[str]: The files to read
+        """
+        paths = existing_paths(file_path) if key_col else [p for p in [file_path] if os.path.exists(p)]
+
+        # a resharded table records its layout beside the table, which overrides the configuration like it does for the services
+        shards = read_layout(file_path) or shards
+        if key_col and shards is not None and shards > 1 and file_path not in paths:
+            for col, op, val in filters:
+                if col == key_col and _OPERATORS[op] is operator.eq:
+                    owner = shard_paths(file_path, shards)[shard_of(val, shards)]
+                    return [owner] if owner in paths else []
+        return paths
+
+    def _chunks(self, table: str, filters: List[Tuple[str, str, Any]], columns: Union[List[str], None] = None) -> Iterator[pd.DataFrame]:
+        """
+        Function to stream the matching rows of a table
+
+        Args:
+            table (str): The table name
+            filters (List[Tuple[str, str, Any]]): The column, operator and value of each condition, all must hold
+            columns (Union[List[str], None], optional): The columns to export. Defaults to all of them.
+
+        Returns:
+            Iterator[pd.DataFrame]: The matching rows, one chunk at a time
+        """
+        file_path, key_col, dtypes = self.tables[table]
+        columns = columns or list(dtypes)
+        usecols = list(dict.fromkeys(columns + [col for col, _, _ in filters]))
+        chunk_dtypes = {col: dtypes[col] for col in usecols}
+
+        for path in self._paths(file_path=file_path, key_col=key_col, filters=filters, shards=self.shards.get(table)):
+            for chunk in pd.read_csv(path, chunksize=self.chunksize, usecols=lambda col: col in usecols):
+                chunk = apply_dtypes(chunk, chunk_dtypes)
+                mask = pd.Series(True, index=chunk.index)
+                for col, op, val in filters:
+                    mask &= _OPERATORS[op](chunk[col], val).fillna(False).astype(bool)
+                if mask.any():
+                    yield chunk.loc[mask, columns]
+
+    def export(self, table: str, out_path: str, fmt: str = "csv", filters: Union[List[Tuple[str, str, Any]], None] = None, columns: Union[List[str], None] = None) -> int:
+        """
+        Function to export the rows of a table matching the filters
+
+        Args:
+            table (str): The table name
+            out_path (str): The path of the output file, replaced once the export is complete
+            fmt (str, optional): The output format: csv, jsonl or parquet. Defaults to "csv".
+            filters (Union[List[Tuple[str, str, Any]], None], optional): The column, operator and value of each condition. Defaults to None.
+            columns (Union[List[str], None], optional): The columns to export. Defaults to all of them.
+
+        Returns:
+            int: The number of rows exported
+        """
+        try:
+            if table not in self.tables:
+                raise ValueError(f"Unknown table {table}, expected one of {', '.join(self.tables)}")
+            if fmt not in FORMATS:
+                raise ValueError(f"Unknown format {fmt}, expected one of {', '.join(FORMATS)}")
+
+            if fmt == "parquet":
+                try:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                except ImportError:
+                    raise ImportError("Parquet export requires pyarrow, install it with: pip install pyarrow")
+
+            # the output only replaces an earlier export once it is complete
+            tmp_path = f"{out_path}.tmp"
+            dtypes = self.tables[table][2]
+            columns = columns or list(dtypes)
+            rows = 0
+            try:
+                if fmt == "parquet":
+                    writer = None
+                    for chunk in self._chunks(table=table, filters=filters or [], columns=columns):
+                        # categories differ between chunks, every row group is written with plain strings
+                        chunk = chunk.astype({col: "string" for col in chunk.columns if isinstance(chunk[col].dtype, pd.CategoricalDtype)})
+                        batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                        if writer is None:
+                            writer = pq.ParquetWriter(tmp_path, batch.schema)
+                        writer.write_table(batch.cast(writer.schema))
+                        rows += len(chunk)
+                    if writer is None:
+                        pq.write_table(pa.Table.from_pandas(apply_dtypes(pd.DataFrame(columns=columns), {col: dtypes[col] for col in columns}), preserve_index=False), tmp_path)
+                    else:
+                        writer.close()
+                else:
+                    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                        if fmt == "csv":
+                            f.write(",".join(columns) + "\n")
+                        for chunk in self._chunks(table=table, filters=filters or [], columns=columns):
+                            if fmt == "csv":
+                                chunk.to_csv(f, index=False, header=False)
+                            else:
+                                f.write(chunk.to_json(orient="records", lines=True, date_format="iso"))
+                            rows += len(chunk)
+                os.replace(tmp_path, out_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            self.logger.info(f"Exported {rows} row(s) of {table} to {out_path}.")
+            return rows
+        except Exception as e:
+            self.logger.error(f"Error exporting {table}: {e}")
+            raise e
+
+    def export_table(self) -> None:
+        """
+        Function to export a table from the menu
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        table = input(f"Enter table to export ({', '.join(self.tables)}): ").strip()
+        if table not in self.tables:
+            self.logger.warning(f"Unknown table {table}. Not exporting.")
+            return
+        fmt = input(f"Enter format ({', '.join(FORMATS)}): ").strip().lower() or "csv"
+        filters = self.parse_filters(input("Enter filters, e.g. author=Tolkien, availability>0 (blank for all rows): "), self.tables[table][2])
+        self.export(table=table, out_path=input("Enter path of the output file: ").strip(), fmt=fmt, filters=filters)
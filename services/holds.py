@@ -0,0 +1,288 @@
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, List, Set, Tuple, Union
+import os
+
+import pandas as pd
+
+from services.db import DB
+from services.context import StorageContext, default_context
+from services.schema import schema_dtypes, apply_dtypes
+from models.hold import Hold
+
+from config.log import db_logger
+
+class HoldsDB(DB):
+    def __init__(self, file_path: Union[str, None] = None, context: Union[StorageContext, None] = None):
+        context = context or default_context()
+        self.file_path = file_path or context.holds_file_path
+        self.logger = db_logger.getChild("HoldsDB")
+        self.columns = list(Hold.model_fields.keys())
+        super().__init__(columns=self.columns, dtypes=schema_dtypes(Hold, keys=["isbn", "user_id"]), context=context)
+
+        # per isbn FIFO queues of waiting holds: (staff priority queue, regular queue)
+        self._queues: Dict[int, Tuple[Deque[Hold], Deque[Hold]]] = {}
+        self._queues_signature = None
+
+        # the storage is append only, a served hold is cancelled by a tombstone row with its fulfilled_at set
+        # and the file is compacted once the tombstones outnumber the waiting holds
+        self._waiting = 0
+        self._tombstones = 0
+
+    def _hold_queues(self) -> Dict[int, Tuple[Deque[Hold], Deque[Hold]]]:
+        """
+        Function to get the hold queues, rebuilding them if the storage was changed by another writer
+
+        Args:
+            None
+
+        Returns:
+            Dict[int, Tuple[Deque[Hold], Deque[Hold]]]: The priority and regular queue for each isbn
+        """
+        signature = self._signature(self.file_path)
+        if signature == self._queues_signature:
+            return self._queues
+
+        # the storage is append ordered, so reading it in order rebuilds the FIFO queues
+        self._queues = {}
+        self._waiting, self._tombstones = 0, 0
+        for record in self._records(self._load(file_path=self.file_path)):
+            hold = Hold(**record)
+            priority, regular = self._queues.setdefault(hold.isbn, (deque(), deque()))
+            queue = priority if hold.priority else regular
+            if hold.fulfilled_at is None:
+                queue.append(hold)
+                self._waiting += 1
+                continue
+
+            # a tombstone cancels the earliest waiting hold of the user, usually the head of the queue
+            self._tombstones += 1
+            for i, waiting in enumerate(queue):
+                if waiting.user_id == hold.user_id:
+                    del queue[i]
+                    self._waiting -= 1
+                    break
+        self._queues = {isbn: queues for isbn, queues in self._queues.items() if queues[0] or queues[1]}
+        self._queues_signature = signature
+
+        # holds stored before tombstones existed are rewritten once with the fulfilled_at column
+        if os.path.exists(self.file_path):
+            with open(self.file_path, encoding="utf-8") as f:
+                header = f.readline().strip()
+            if header and "fulfilled_at" not in header.split(","):
+                self._compact()
+        return self._queues
+
+    def _waiting_holds(self) -> pd.DataFrame:
+        """
+        Function to get the holds that are still waiting, in queue order per isbn
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame: The waiting holds
+        """
+        holds = [hold.model_dump() for priority, regular in self._hold_queues().values() for hold in (*priority, *regular)]
+        return apply_dtypes(pd.DataFrame(holds, columns=self.columns), self.dtypes)
+
+    def _fulfil(self, holds: List[Hold]) -> None:
+        """
+        Function to persist that holds were served or dropped by appending their tombstones, without rewriting the storage
+
+        Args:
+            holds (List[Hold]): The holds already popped from their queues
+
+        Returns:
+            None
+        """
+        if not holds:
+            return
+        fresh = self._queues_signature == self._signature(self.file_path)
+        now = datetime.now()
+        self._append_many(file_path=self.file_path, data=[hold.model_copy(update={"fulfilled_at": now}) for hold in holds])
+        if not fresh:
+            self._queues_signature = None
+            return
+
+        self._waiting -= len(holds)
+        self._tombstones += len(holds)
+        self._queues_signature = self._signature(self.file_path)
+        if self._tombstones > self._waiting + 1024:
+            self._compact()
+
+    def _cancel(self, holds: pd.DataFrame) -> None:
+        """
+        Function to cancel waiting holds, e.g. of books or users that no longer exist
+
+        Args:
+            holds (pd.DataFrame): The isbn, user_id and priority of the holds to cancel
+
+        Returns:
+            None
+        """
+        with self.context.locked(self.file_path):
+            queues = self._hold_queues()
+            cancelled = []
+            for record in self._records(holds):
+                priority, regular = queues.get(record["isbn"], ((), ()))
+                queue = priority if record["priority"] else regular
+                for i, hold in enumerate(queue):
+                    if hold.user_id == record["user_id"]:
+                        cancelled.append(hold)
+                        del queue[i]
+                        break
+                if record["isbn"] in queues and not priority and not regular:
+                    del queues[record["isbn"]]
+            self._fulfil(cancelled)
+
+    def _compact(self) -> None:
+        """
+        Function to rewrite the storage with only the waiting holds, dropping the served holds and their tombstones
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self._store(file_path=self.file_path, df=self._waiting_holds())
+        self._tombstones = 0
+        self._queues_signature = self._signature(self.file_path)
+        self.logger.info(f"Hold storage compacted to {self._waiting} waiting hold(s).")
+
+    def has_holds(self, isbn: int) -> bool:
+        """
+        Function to check if anyone is waiting for the book with the given isbn
+
+        Args:
+            isbn (int): The isbn of the book
+
+        Returns:
+            bool: True if there is at least one hold, False otherwise
+        """
+        try:
+            priority, regular = self._hold_queues().get(isbn, ((), ()))
+            return len(priority) > 0 or len(regular) > 0
+        except Exception as e:
+            self.logger.error(f"Error searching holds in storage: {e}")
+            raise e
+
+    def next_hold(self, isbn: int) -> Union[Hold, None]:
+        """
+        Function to pop the next hold for the book with the given isbn, staff holds first
+
+        Args:
+            isbn (int): The isbn of the book
+
+        Returns:
+            Union[Hold, None]: The hold that should receive the book, None if nobody is waiting
+        """
+        try:
+            with self.context.locked(self.file_path):
+                queues = self._hold_queues()
+                if isbn not in queues:
+                    return None
+
+                priority, regular = queues[isbn]
+                hold = priority.popleft() if priority else regular.popleft()
+                if not priority and not regular:
+                    del queues[isbn]
+
+                # the popped hold is cancelled by appending its tombstone
+                self._fulfil([hold])
+
+                self.logger.info(f"Hold for book {hold.isbn} assigned to user {hold.user_id}.")
+                return hold
+        except Exception as e:
+            self.logger.error(f"Error removing hold from storage: {e}")
+            raise e
+
+    def take_holds(self, isbns: Iterable[int], user_ids: Set[int], borrowers: Union[Dict[int, int], None] = None) -> Dict[int, Hold]:
+        """
+        Function to pop the next hold of many returned books at once, cancelling them with a single append.
+        Holds of users that were removed while waiting, or that just returned the copy, are dropped on the way.
+
+        Args:
+            isbns (Iterable[int]): The isbns of the returned copies
+            user_ids (Set[int]): The users that still exist
+            borrowers (Union[Dict[int, int], None], optional): The user who returned each copy. Defaults to None.
+
+        Returns:
+            Dict[int, Hold]: The hold that receives the copy, for each book somebody is waiting for
+        """
+        try:
+            with self.context.locked(self.file_path):
+                queues = self._hold_queues()
+                taken, popped = {}, []
+                for isbn in isbns:
+                    priority, regular = queues.get(isbn, ((), ()))
+                    while isbn not in taken and (priority or regular):
+                        hold = priority.popleft() if priority else regular.popleft()
+                        popped.append(hold)
+                        if hold.user_id not in user_ids:
+                            self.logger.warning(f"User {hold.user_id} no longer exists. Skipping hold.")
+                        elif borrowers is not None and borrowers.get(isbn) == hold.user_id:
+                            self.logger.warning(f"User {hold.user_id} returned the book they were waiting for. Skipping hold.")
+                        else:
+                            taken[isbn] = hold
+                    if isbn in queues and not priority and not regular:
+                        del queues[isbn]
+                if not popped:
+                    return taken
+
+                self._fulfil(popped)
+                self.logger.info(f"{len(taken)} returned book(s) assigned to waiting users.")
+                return taken
+        except Exception as e:
+            self.logger.error(f"Error removing holds from storage: {e}")
+            raise e
+
+    def add_hold(self, hold: Hold) -> bool:
+        """
+        Function to add a hold to the back of the queue of its book
+
+        Args:
+            hold (Hold): The hold to be added
+
+        Returns:
+            bool: True if the hold was added, False if the user is already waiting for the book
+        """
+        try:
+            with self.context.locked(self.file_path):
+                queues = self._hold_queues()
+                priority, regular = queues.get(hold.isbn, ((), ()))
+                if any(h.user_id == hold.user_id for h in (*priority, *regular)):
+                    self.logger.warning("User already has a hold on this book. Not adding hold.")
+                    return False
+
+                hold.requested_at = hold.requested_at or datetime.now()
+                self._append(file_path=self.file_path, data=hold)
+
+                priority, regular = queues.setdefault(hold.isbn, (deque(), deque()))
+                (priority if hold.priority else regular).append(hold)
+                self._waiting += 1
+                self._queues_signature = self._signature(self.file_path)
+                self.logger.info("Hold added.")
+                return True
+        except Exception as e:
+            self.logger.error(f"Error adding hold to storage: {e}")
+            raise e
+
+    def list_holds(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to list the holds waiting in the storage
+
+        Args:
+            print_output (bool): Whether to print the output or not
+
+        Returns:
+            Union[None, pd.DataFrame]: The list of holds if print_output is False
+        """
+        try:
+            if not print_output:
+                return self._waiting_holds()
+            print(self._waiting_holds())
+        except Exception as e:
+            self.logger.error(f"Error listing holds in storage: {e}")
+            raise e
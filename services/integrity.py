@@ -0,0 +1,271 @@
+from typing import Dict, List, Union
+
+import pandas as pd
+
+from services.db import DB
+from services.check import CheckoutDB
+from config.log import db_logger
+
+# columns of the violations report
+_REPORT_COLUMNS = ["table", "invariant", "key", "detail"]
+
+class IntegrityChecker():
+    """
+    fsck for the library storage. Every cross-table invariant is checked on whole columns at once
+    (duplicate keys, anti-joins of loans and holds against books and users, user flags against open
+    loans, availability against stock and open loans, negative availability), and the violations can
+    be repaired with one write per table.
+    """
+    def __init__(self, checkout_db: CheckoutDB) -> None:
+        self.checkout_db = checkout_db
+        self.books_db = checkout_db.books_db
+        self.users_db = checkout_db.users_db
+        self.holds_db = checkout_db.holds_db
+        self.logger = db_logger.getChild("IntegrityChecker")
+
+    def _tables(self) -> Dict[str, pd.DataFrame]:
+        """
+        Function to load every table once, the checks and repairs work on these copies
+
+        Args:
+            None
+
+        Returns:
+            Dict[str, pd.DataFrame]: The books, users, checkout and holds tables
+        """
+        return {
+            "books": self.books_db._load(file_path=self.books_db.file_path).reset_index(drop=True),
+            "users": self.users_db._load(file_path=self.users_db.file_path).reset_index(drop=True),
+            "checkout": self.checkout_db._load(file_path=self.checkout_db.file_path).reset_index(drop=True),
+            "holds": self.holds_db._waiting_holds().reset_index(drop=True),
+        }
+
+    @staticmethod
+    def _violations(table: str, invariant: str, keys: pd.Series, detail: pd.Series) -> pd.DataFrame:
+        """
+        Function to build the report rows of one invariant
+
+        Args:
+            table (str): The table holding the bad rows
+            invariant (str): The name of the violated invariant
+            keys (pd.Series): The key of each bad row
+            detail (pd.Series): A description of each bad row
+
+        Returns:
+            pd.DataFrame: The report rows
+        """
+        return pd.DataFrame({"table": table, "invariant": invariant, "key": keys.to_numpy(), "detail": detail.to_numpy()}, columns=_REPORT_COLUMNS)
+
+    def _masks(self, tables: Dict[str, pd.DataFrame]) -> Dict[str, pd.Series]:
+        """
+        Function to evaluate every invariant, one boolean mask of bad rows per invariant
+
+        Args:
+            tables (Dict[str, pd.DataFrame]): The tables
+
+        Returns:
+            Dict[str, pd.Series]: The mask of each invariant over the rows of its table
+        """
+        books, users, loans, holds = tables["books"], tables["users"], tables["checkout"], tables["holds"]
+        masks = {
+            "duplicate_isbn": books["isbn"].duplicated(keep="last"),
+            "duplicate_user_id": users["user_id"].duplicated(keep="last"),
+            "duplicate_loan": loans["isbn"].duplicated(keep="last"),
+        }
+
+        # anti-joins: hash lookups of whole key columns instead of a search per row
+        isbns, user_ids = books["isbn"].to_numpy(), users["user_id"].to_numpy()
+        masks["loan_missing_book"] = ~loans["isbn"].isin(isbns)
+        masks["loan_missing_user"] = ~loans["user_id"].isin(user_ids)
+        masks["hold_missing_book"] = ~holds["isbn"].isin(isbns)
+        masks["hold_missing_user"] = ~holds["user_id"].isin(user_ids)
+
+        # a user is checked out exactly when one of the remaining loans is theirs
+        remaining = loans[~(masks["duplicate_loan"] | masks["loan_missing_book"])]
+        masks["checkout_flag_mismatch"] = users["is_checked_out"].astype(bool) != users["user_id"].isin(remaining["user_id"].to_numpy())
+
+        # every copy in stock is either on the shelf or out on a loan, books added before stock was recorded are not checked
+        on_loan = self._on_loan(books, remaining)
+        masks["availability_mismatch"] = books["stock"].notna() & (books["availability"].fillna(0) + on_loan != books["stock"]).fillna(False)
+
+        masks["negative_availability"] = books["availability"].fillna(0) < 0
+        return masks
+
+    @staticmethod
+    def _on_loan(books: pd.DataFrame, loans: pd.DataFrame) -> pd.Series:
+        """
+        Function to count the open loans of every book
+
+        Args:
+            books (pd.DataFrame): The books
+            loans (pd.DataFrame): The open loans
+
+        Returns:
+            pd.Series: The number of open loans of each row of books
+        """
+        return books["isbn"].map(loans["isbn"].value_counts()).fillna(0).astype("Int64")
+
+    def _report(self, tables: Dict[str, pd.DataFrame], masks: Dict[str, pd.Series]) -> pd.DataFrame:
+        """
+        Function to describe the rows violating each invariant
+
+        Args:
+            tables (Dict[str, pd.DataFrame]): The tables
+            masks (Dict[str, pd.Series]): The mask of each invariant over the rows of its table
+
+        Returns:
+            pd.DataFrame: The table, invariant, key and details of every violation
+        """
+        books, users, loans, holds = tables["books"], tables["users"], tables["checkout"], tables["holds"]
+
+        def loan_detail(df: pd.DataFrame) -> pd.Series:
+            return "user_id=" + df["user_id"].astype(str)
+
+        def hold_detail(df: pd.DataFrame) -> pd.Series:
+            return "isbn=" + df["isbn"].astype(str) + " user_id=" + df["user_id"].astype(str)
+
+        reports: List[pd.DataFrame] = []
+        for invariant, mask in masks.items():
+            if not mask.any():
+                continue
+            if invariant == "duplicate_isbn":
+                bad = books[mask]
+                reports.append(self._violations("books", invariant, bad["isbn"], "title=" + bad["title"].astype(str)))
+            elif invariant == "duplicate_user_id":
+                bad = users[mask]
+                reports.append(self._violations("users", invariant, bad["user_id"], "name=" + bad["name"].astype(str)))
+            elif invariant.startswith("duplicate_loan") or invariant.startswith("loan_"):
+                bad = loans[mask]
+                reports.append(self._violations("checkout", invariant, bad["isbn"], loan_detail(bad)))
+            elif invariant.startswith("hold_"):
+                bad = holds[mask]
+                reports.append(self._violations("holds", invariant, bad["isbn"], hold_detail(bad)))
+            elif invariant == "checkout_flag_mismatch":
+                bad = users[mask]
+                reports.append(self._violations("users", invariant, bad["user_id"], "is_checked_out=" + bad["is_checked_out"].astype(str)))
+            elif invariant == "availability_mismatch":
+                bad = books[mask]
+                on_loan = self._on_loan(bad, loans[~(masks["duplicate_loan"] | masks["loan_missing_book"])])
+                reports.append(self._violations("books", invariant, bad["isbn"], "availability=" + bad["availability"].astype(str) + " on_loan=" + on_loan.astype(str) + " stock=" + bad["stock"].astype(str)))
+            elif invariant == "negative_availability":
+                bad = books[mask]
+                reports.append(self._violations("books", invariant, bad["isbn"], "availability=" + bad["availability"].astype(str)))
+
+        report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=_REPORT_COLUMNS)
+        self.logger.info(f"Integrity check found {len(report)} violation(s).")
+        return report
+
+    def check(self) -> pd.DataFrame:
+        """
+        Function to check every invariant of the storage
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame: The table, invariant, key and details of every violation
+        """
+        try:
+            tables = self._tables()
+            return self._report(tables, self._masks(tables))
+        except Exception as e:
+            self.logger.error(f"Error checking storage integrity: {e}")
+            raise e
+
+    def repair(self) -> pd.DataFrame:
+        """
+        Function to repair the violations: duplicate keys keep their last row, loans of missing books
+        or users and holds of missing books or users are dropped, checkout flags are set from the
+        remaining loans, availability is set to the stock minus the open loans (dropped loans return
+        their copy where the stock is unknown) and negative availability is reset to 0. Every table is
+        written at most once.
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame: The violations that were repaired
+        """
+        try:
+            with self.checkout_db._locked():
+                tables = self._tables()
+                masks = self._masks(tables)
+                report = self._report(tables, masks)
+                if report.empty:
+                    return report
+                books, users, loans, holds = tables["books"], tables["users"], tables["checkout"], tables["holds"]
+
+                # a dropped loan of an existing book, duplicated or of a missing user, still holds a copy: put it back on the shelf
+                dropped = masks["duplicate_loan"] | masks["loan_missing_book"] | masks["loan_missing_user"]
+                books = books.copy()
+                books["availability"] = books["availability"] + self._on_loan(books, loans[dropped & ~masks["loan_missing_book"]])
+
+                # where the stock is known, the copies that are not out on the remaining loans are on the shelf
+                on_loan = self._on_loan(books, loans[~dropped])
+                stocked = books["stock"].notna()
+                books.loc[stocked, "stock"] = books.loc[stocked, "stock"].where(books.loc[stocked, "stock"] >= on_loan[stocked], on_loan[stocked])
+                books.loc[stocked, "availability"] = books.loc[stocked, "stock"] - on_loan[stocked]
+                books.loc[books["availability"].fillna(0) < 0, "availability"] = 0
+
+                users = users.copy()
+                users.loc[masks["checkout_flag_mismatch"], "is_checked_out"] = ~users.loc[masks["checkout_flag_mismatch"], "is_checked_out"]
+
+                counts, before = books[["availability", "stock"]], tables["books"][["availability", "stock"]]
+                changed = ((counts != before).fillna(False) | (counts.isna() != before.isna())).any(axis=1)
+                self._save(db=self.books_db, df=books[~masks["duplicate_isbn"]], dirty=masks["duplicate_isbn"].any(), upserts=books[changed & ~masks["duplicate_isbn"]])
+                self._save(db=self.users_db, df=users[~masks["duplicate_user_id"]], dirty=masks["duplicate_user_id"].any(), upserts=users[masks["checkout_flag_mismatch"] & ~masks["duplicate_user_id"]])
+
+                # removed duplicates are not published, every reader already keeps the last row of a key
+                self._save(db=self.checkout_db, df=loans[~dropped], dirty=masks["duplicate_loan"].any(), deletes=loans.loc[dropped & ~masks["duplicate_loan"], ["isbn"]])
+
+                # holds are cancelled with tombstones like the holds that are served
+                self.holds_db._cancel(holds[masks["hold_missing_book"] | masks["hold_missing_user"]])
+
+                self.logger.info(f"Repaired {len(report)} violation(s).")
+                return report
+        except Exception as e:
+            self.logger.error(f"Error repairing storage integrity: {e}")
+            raise e
+
+    @staticmethod
+    def _save(db: DB, df: pd.DataFrame, dirty: bool = False, upserts: Union[pd.DataFrame, None] = None, deletes: Union[pd.DataFrame, None] = None) -> None:
+        """
+        Function to write a repaired table once and publish the repaired rows to the change log
+
+        Args:
+            db (DB): The service owning the table
+            df (pd.DataFrame): The repaired table
+            dirty (bool, optional): Whether the table changed in a way that is not published. Defaults to False.
+            upserts (Union[pd.DataFrame, None], optional): The rows whose values were repaired. Defaults to None.
+            deletes (Union[pd.DataFrame, None], optional): The matched values of the rows that were removed. Defaults to None.
+
+        Returns:
+            None
+        """
+        upserts = upserts if upserts is not None else df.iloc[0:0]
+        deletes = deletes if deletes is not None else df.iloc[0:0]
+        if not dirty and upserts.empty and deletes.empty:
+            return
+
+        db._store(file_path=db.file_path, df=df)
+        for record in db._records(deletes):
+            db._emit(file_path=db.file_path, op="delete", key=record[db.key_col] if db.key_col in record else None, values=record)
+        for record in db._records(upserts):
+            db._emit(file_path=db.file_path, op="upsert", key=record[db.key_col], values=record)
+
+    def fsck(self, print_output: bool = True) -> None:
+        """
+        Function to check the storage and optionally repair it from the menu
+
+        Args:
+            Takes input from the user
+            print_output (bool, optional): Whether to print the violations. Defaults to True.
+
+        Returns:
+            None
+        """
+        report = self.check()
+        if print_output:
+            print(report if not report.empty else "No violations found.")
+        if not report.empty and input("Repair the violations? (y/n): ").strip().lower() in ("y", "yes"):
+            self.repair()
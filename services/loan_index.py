@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from config.log import db_logger
+
+class TimeIndex():
+    """
+    Sorted array of timestamps (as int64 nanoseconds) paired with a value per entry.
+    Range lookups are a bisect over the sorted timestamps instead of a scan over the table.
+    """
+    def __init__(self, capacity: int = 1024) -> None:
+        self.logger = db_logger.getChild("TimeIndex")
+        self._times = np.empty(capacity, dtype="int64")
+        self._values = np.empty(capacity, dtype="int64")
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _to_ns(time) -> int:
+        return pd.Timestamp(time).value
+
+    def _reserve(self, size: int) -> None:
+        """
+        Function to grow the underlying buffers so that they can hold at least size entries
+
+        Args:
+            size (int): The number of entries required
+
+        Returns:
+            None
+        """
+        if size <= len(self._times):
+            return
+        capacity = max(size, 2 * len(self._times))
+        times = np.empty(capacity, dtype="int64")
+        values = np.empty(capacity, dtype="int64")
+        times[:self._size] = self._times[:self._size]
+        values[:self._size] = self._values[:self._size]
+        self._times, self._values = times, values
+
+    def build(self, times: pd.Series, values: pd.Series) -> None:
+        """
+        Function to (re)build the index from a column of timestamps and the matching values
+
+        Args:
+            times (pd.Series): The timestamps, missing entries are skipped
+            values (pd.Series): The value stored against each timestamp (a key or a row position)
+
+        Returns:
+            None
+        """
+        try:
+            times = pd.to_datetime(pd.Series(times).reset_index(drop=True), errors="coerce").dt.as_unit("ns")
+            values = pd.Series(values).reset_index(drop=True)
+            mask = times.notna().to_numpy()
+
+            t = times[mask].astype("int64").to_numpy()
+            v = values[mask].astype("int64").to_numpy()
+            order = np.argsort(t, kind="stable")
+
+            self._times = np.empty(0, dtype="int64")
+            self._values = np.empty(0, dtype="int64")
+            self._size = 0
+            self._reserve(max(len(t), 1024))
+            self._times[:len(t)] = t[order]
+            self._values[:len(t)] = v[order]
+            self._size = len(t)
+        except Exception as e:
+            self.logger.error(f"Error building time index: {e}")
+            raise e
+
+    def insert(self, time, value: int) -> None:
+        """
+        Function to insert an entry keeping the timestamps sorted
+
+        Args:
+            time: The timestamp of the entry
+            value (int): The value stored against the timestamp
+
+        Returns:
+            None
+        """
+        t = self._to_ns(time)
+        self._reserve(self._size + 1)
+
+        # appends in time order are the common case and do not shift anything
+        pos = self._size
+        if self._size and self._times[self._size - 1] > t:
+            pos = int(np.searchsorted(self._times[:self._size], t, side="right"))
+            self._times[pos + 1:self._size + 1] = self._times[pos:self._size]
+            self._values[pos + 1:self._size + 1] = self._values[pos:self._size]
+        self._times[pos] = t
+        self._values[pos] = value
+        self._size += 1
+
+    def remove(self, time, value: int) -> bool:
+        """
+        Function to remove an entry from the index
+
+        Args:
+            time: The timestamp of the entry
+            value (int): The value stored against the timestamp
+
+        Returns:
+            bool: True if the entry was found and removed, False otherwise
+        """
+        t = self._to_ns(time)
+        times = self._times[:self._size]
+        lo = int(np.searchsorted(times, t, side="left"))
+        hi = int(np.searchsorted(times, t, side="right"))
+        matches = np.nonzero(self._values[lo:hi] == value)[0]
+        if len(matches) == 0:
+            return False
+
+        pos = lo + int(matches[0])
+        self._times[pos:self._size - 1] = self._times[pos + 1:self._size]
+        self._values[pos:self._size - 1] = self._values[pos + 1:self._size]
+        self._size -= 1
+        return True
+
+    def range(self, start=None, end=None) -> np.ndarray:
+        """
+        Function to get the values whose timestamps fall in [start, end)
+
+        Args:
+            start (optional): The inclusive lower bound. Defaults to the beginning of the index.
+            end (optional): The exclusive upper bound. Defaults to the end of the index.
+
+        Returns:
+            np.ndarray: The values in timestamp order
+        """
+        times = self._times[:self._size]
+        lo = 0 if start is None else int(np.searchsorted(times, self._to_ns(start), side="left"))
+        hi = self._size if end is None else int(np.searchsorted(times, self._to_ns(end), side="left"))
+        return self._values[lo:max(lo, hi)].copy()
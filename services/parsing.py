@@ -0,0 +1,89 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Iterable, List, Tuple, Type
+import csv
+
+from pydantic import BaseModel, ValidationError
+
+from services.schema import unwrap
+
+def parse_bool(raw: str) -> bool:
+    """
+    Function to parse a boolean the way a user would type it
+
+    Args:
+        raw (str): The raw input
+
+    Returns:
+        bool: True for true/yes/y/1, False for false/no/n/0
+    """
+    value = raw.strip().lower()
+    if value in ("true", "yes", "y", "1"):
+        return True
+    if value in ("false", "no", "n", "0"):
+        return False
+    raise ValueError(f"Invalid boolean: {raw}")
+
+_CONVERTERS = {int: int, str: str, float: float, bool: parse_bool, datetime: datetime.fromisoformat}
+
+def _converter(annotation) -> Callable[[str], Any]:
+    """
+    Function to build the converter of a single field, empty input is always None
+
+    Args:
+        annotation: The annotation of the pydantic field
+
+    Returns:
+        Callable[[str], Any]: The converter from raw input to the field type
+    """
+    convert = _CONVERTERS.get(unwrap(annotation), unwrap(annotation))
+    return lambda raw: None if raw == "" else convert(raw)
+
+@lru_cache(maxsize=None)
+def compile_parser(model: Type[BaseModel], required_only: bool = True) -> Tuple[Tuple[str, ...], Callable[[Iterable[str]], dict]]:
+    """
+    Function to compile, once per model, a parser for the fields the user has to enter
+
+    Args:
+        model (Type[BaseModel]): The pydantic model
+        required_only (bool, optional): Whether to parse only the required fields. Defaults to True.
+
+    Returns:
+        Tuple[Tuple[str, ...], Callable[[Iterable[str]], dict]]: The names of the parsed fields and the parser
+            turning their raw values, in that order, into a dict
+    """
+    fields = tuple((name, _converter(field.annotation)) for name, field in model.model_fields.items() if field.is_required() or not required_only)
+    names = tuple(name for name, _ in fields)
+
+    def parse(values: Iterable[str]) -> dict:
+        return {name: convert(raw) for (name, convert), raw in zip(fields, values)}
+    return names, parse
+
+def parse_batch(model: Type[BaseModel], lines: Iterable[str]) -> Tuple[List[BaseModel], List[Tuple[int, str]]]:
+    """
+    Function to parse many records at once, one comma separated record per line with the
+    fields in model order. Trailing optional fields can be left out to use their defaults
+    and a header line with the field names is skipped.
+
+    Args:
+        model (Type[BaseModel]): The pydantic model of a record
+        lines (Iterable[str]): The lines to parse, e.g. an open file or sys.stdin
+
+    Returns:
+        Tuple[List[BaseModel], List[Tuple[int, str]]]: The valid records and the line number and error of every invalid line
+    """
+    required, _ = compile_parser(model)
+    names, parse = compile_parser(model, required_only=False)
+    records, errors = [], []
+    for line_no, row in enumerate(csv.reader(lines), start=1):
+        row = [value.strip() for value in row]
+        if not any(row) or (line_no == 1 and tuple(row) == names[:len(row)]):
+            continue
+        try:
+            if not len(required) <= len(row) <= len(names):
+                raise ValueError(f"Expected {len(required)} to {len(names)} values ({', '.join(names)}), got {len(row)}")
+            values = {name: val for name, val in parse(row).items() if val is not None or name in required}
+            records.append(model(**values))
+        except (ValueError, TypeError, ValidationError) as e:
+            errors.append((line_no, str(e)))
+    return records, errors
@@ -0,0 +1,297 @@
+from typing import Dict, List, Tuple, Union
+import time
+
+import pandas as pd
+
+from services.changelog import ChangeLog
+from services.schema import apply_dtypes
+from services.shards import existing_paths, read_shard
+from config.log import db_logger
+
+# marker of a row deleted by a change that has not been applied yet
+_DELETED = object()
+
+class Replica():
+    """
+    Read only copy of the primary tables kept in memory at a branch node. It is bootstrapped from the
+    primary table files and then follows the primary change log, so reads are served locally and are
+    never more than max_staleness seconds behind the log.
+    """
+    def __init__(self, changelog: ChangeLog, max_staleness: float = 5.0) -> None:
+        self.changelog = changelog
+        self.max_staleness = max_staleness
+        self.logger = db_logger.getChild("Replica")
+
+        # key column and dtypes of each table, the primary files they are read from and the tables indexed by their key
+        self._specs: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self._files: Dict[str, str] = {}
+        self._tables: Dict[str, pd.DataFrame] = {}
+
+        # position in the primary log the tables reflect, and when the log was last polled
+        self._position: Union[Tuple[int, int], None] = None
+        self._polled_at = 0.0
+        self.applied_ts: Union[str, None] = None
+
+    def register(self, table: str, file_path: str, key_col: str, dtypes: Dict[str, str]) -> None:
+        """
+        Function to start replicating a table, reading its current content from the primary files
+
+        Args:
+            table (str): The table name used in the change log
+            file_path (str): The path of the primary table file
+            key_col (str): The primary key column
+            dtypes (Dict[str, str]): The schema dtypes of the table
+
+        Returns:
+            None
+        """
+        if table in self._specs:
+            return
+        try:
+            # the log position is taken before the files are read, replaying the changes made
+            # in between is harmless because every replicated change is keyed and idempotent
+            if self._position is None:
+                self._position = self.changelog.tail()
+                self._polled_at = time.monotonic()
+
+            df = self._read_files(file_path, dtypes)
+            self._specs[table] = (key_col, dtypes)
+            self._files[table] = file_path
+            self._tables[table] = self._index(df, key_col)
+            self.logger.info(f"Replicating {table} from {file_path}, {len(df)} rows.")
+        except Exception as e:
+            self.logger.error(f"Error bootstrapping replica of {table}: {e}")
+            raise e
+
+    @staticmethod
+    def _read_files(file_path: str, dtypes: Dict[str, str]) -> pd.DataFrame:
+        """
+        Function to read a primary table from its files, whatever shard layout it is stored in
+
+        Args:
+            file_path (str): The path of the primary table file
+            dtypes (Dict[str, str]): The schema dtypes of the table
+
+        Returns:
+            pd.DataFrame: The table
+        """
+        frames = [read_shard(path, dtypes) for path in existing_paths(file_path)]
+        return apply_dtypes(pd.concat(frames, ignore_index=True), dtypes) if frames else read_shard(file_path, dtypes)
+
+    def _reload(self) -> None:
+        """
+        Function to read every table again from the primary files, after the primary was restored from a backup
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        for table, file_path in self._files.items():
+            key_col, dtypes = self._specs[table]
+            self._tables[table] = self._index(self._read_files(file_path, dtypes), key_col)
+        self.logger.info("Primary was restored from a backup, replicated tables read again.")
+
+    @staticmethod
+    def _index(df: pd.DataFrame, key_col: str) -> pd.DataFrame:
+        """
+        Function to index a table by its key, keeping the last version of duplicated keys
+
+        Args:
+            df (pd.DataFrame): The table
+            key_col (str): The primary key column
+
+        Returns:
+            pd.DataFrame: The table indexed by its key, the key column is kept
+        """
+        df = df.drop_duplicates(subset=[key_col], keep="last")
+        df.index = pd.Index(df[key_col].to_numpy())
+        return df
+
+    @property
+    def applied_seq(self) -> int:
+        """
+        The sequence number of the last primary change the tables reflect
+        """
+        return (self._position or (0, 0))[0]
+
+    def poll(self) -> int:
+        """
+        Function to apply the changes appended to the primary log since the last poll
+
+        Args:
+            None
+
+        Returns:
+            int: The number of changes read from the log
+        """
+        try:
+            changes: List[dict] = []
+            seq, offset = self._position or (0, 0)
+            for change, next_offset in self.changelog.read(after=seq, offset=offset):
+                changes.append(change)
+                seq, offset = change["seq"], next_offset
+
+            if changes:
+                self.apply(changes)
+                self.applied_ts = changes[-1]["ts"]
+            self._position = (seq, offset)
+            self._polled_at = time.monotonic()
+            return len(changes)
+        except Exception as e:
+            self.logger.error(f"Error applying primary changes: {e}")
+            raise e
+
+    def apply(self, changes: List[dict]) -> None:
+        """
+        Function to apply a batch of changes, coalescing them per key so every table is rebuilt at most once.
+        Used by poll for the changes of the primary log and by restores to replay the changes of a backup.
+
+        Args:
+            changes (List[dict]): The changes in log order
+
+        Returns:
+            None
+        """
+        pending: Dict[str, Dict] = {}
+        for change in changes:
+            if change["op"] == "restore":
+                # the changes after the restored one were undone on the primary, its files hold the restored state
+                pending = {}
+                self._reload()
+                continue
+
+            table = change["table"]
+            if table not in self._specs:
+                continue
+            rows = pending.setdefault(table, {})
+            values = change["values"]
+
+            if change["op"] == "delete" and change["key"] is None:
+                # deletes on a non key column cannot be coalesced, flush what is pending first
+                self._apply_table(table, rows)
+                df = self._tables[table]
+                (col, val), = values.items()
+                self._tables[table] = df[df[col].astype(object) != val]
+                pending[table] = {}
+            elif change["op"] == "delete":
+                rows[change["key"]] = _DELETED
+            elif change["op"] in ("insert", "upsert"):
+                rows[change["key"]] = {"replace": True, **values}
+            elif change["op"] == "update":
+                row = rows.get(change["key"])
+                rows[change["key"]] = {"replace": False, **values} if row is None or row is _DELETED else {**row, **values}
+
+        for table, rows in pending.items():
+            self._apply_table(table, rows)
+
+    def _apply_table(self, table: str, rows: Dict) -> None:
+        """
+        Function to apply the coalesced changes of one table
+
+        Args:
+            table (str): The table name
+            rows (Dict): The final change of each key, _DELETED or the values to set
+
+        Returns:
+            None
+        """
+        if not rows:
+            return
+        key_col, dtypes = self._specs[table]
+        df = self._tables[table]
+
+        replaced = {key for key, row in rows.items() if row is _DELETED or row["replace"] or key not in df.index}
+        updates = {key: row for key, row in rows.items() if row is not _DELETED and not row["replace"] and key in df.index}
+
+        # partial updates of existing rows
+        if updates:
+            df = df.copy()
+            for key, row in updates.items():
+                for col, val in row.items():
+                    if col == "replace" or col not in df.columns:
+                        continue
+                    if isinstance(df[col].dtype, pd.CategoricalDtype) and val not in df[col].cat.categories:
+                        df[col] = df[col].cat.add_categories([val])
+                    df.loc[key, col] = val
+
+        # deleted and replaced rows are dropped, the new versions are appended
+        df = df.drop(index=[key for key in replaced if key in df.index])
+        new_rows = [{col: row.get(col) for col in dtypes} for key, row in rows.items() if key in replaced and row is not _DELETED]
+        if new_rows:
+            new_rows = apply_dtypes(pd.DataFrame(new_rows), dtypes)
+            df = self._index(new_rows if df.empty else pd.concat([df, new_rows]), key_col)
+        self._tables[table] = apply_dtypes(df, dtypes)
+
+    def _fresh(self) -> None:
+        """
+        Function to poll the log if the tables may be older than the staleness bound
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if time.monotonic() - self._polled_at >= self.max_staleness:
+            self.poll()
+
+    def table(self, table: str) -> pd.DataFrame:
+        """
+        Function to get a replicated table, at most max_staleness seconds behind the primary log
+
+        Args:
+            table (str): The table name
+
+        Returns:
+            pd.DataFrame: The table
+        """
+        self._fresh()
+        return self._tables[table]
+
+    def search(self, table: str, key: str, val) -> pd.DataFrame:
+        """
+        Function to search a replicated table, key lookups use the hash index of the table
+
+        Args:
+            table (str): The table name
+            key (str): The column to search
+            val: The value to search for
+
+        Returns:
+            pd.DataFrame: The rows that were found
+        """
+        df = self.table(table)
+        if key == self._specs[table][0]:
+            return df.loc[[val]] if val in df.index else df.iloc[0:0]
+        return df[df[key] == val]
+
+    def lag(self) -> dict:
+        """
+        Function to report how far behind the primary the replica is
+
+        Args:
+            None
+
+        Returns:
+            dict: The applied sequence number, the last sequence number of the primary and the time of the last applied change
+        """
+        return {"applied_seq": self.applied_seq, "primary_seq": self.changelog.tail()[0], "applied_ts": self.applied_ts}
+
+_replicas: Dict[str, Replica] = {}
+
+def open_replica(changelog: ChangeLog, max_staleness: float) -> Replica:
+    """
+    Function to get the replica following a primary log, shared by every DB of the process
+
+    Args:
+        changelog (ChangeLog): The change log of the primary
+        max_staleness (float): The maximum age of the served data in seconds
+
+    Returns:
+        Replica: The replica
+    """
+    if changelog.file_path not in _replicas:
+        _replicas[changelog.file_path] = Replica(changelog=changelog, max_staleness=max_staleness)
+    return _replicas[changelog.file_path]
@@ -0,0 +1,103 @@
+from datetime import datetime
+from typing import Dict, Iterable, Type, Union
+import typing
+
+import pandas as pd
+from pydantic import BaseModel
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+def unwrap(annotation) -> type:
+    """
+    Function to get the concrete type of a field, dropping None from Union[..., None]
+
+    Args:
+        annotation: The annotation of the pydantic field
+
+    Returns:
+        type: The first non None type of the annotation
+    """
+    if typing.get_origin(annotation) is Union:
+        return [a for a in typing.get_args(annotation) if a is not type(None)][0]
+    return annotation
+
+def schema_dtypes(model: Type[BaseModel], keys: Iterable[str] = (), categorical: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Function to derive the pandas dtype of every column from a pydantic model
+
+    Args:
+        model (Type[BaseModel]): The pydantic model describing a row of the table
+        keys (Iterable[str], optional): Key columns, stored as non nullable int64. Defaults to ().
+        categorical (Iterable[str], optional): Low cardinality string columns, stored as category. Defaults to ().
+
+    Returns:
+        Dict[str, str]: The dtype of each column, in the order of the model fields
+    """
+    dtypes = {}
+    for name, field in model.model_fields.items():
+        annotation = unwrap(field.annotation)
+        if name in categorical:
+            dtypes[name] = "category"
+        elif annotation is bool:
+            dtypes[name] = "bool" if field.default is not None else "boolean"
+        elif annotation is int:
+            dtypes[name] = "int64" if name in keys else "Int64"
+        elif annotation is datetime:
+            dtypes[name] = "datetime64[ns]"
+        else:
+            dtypes[name] = STRING_DTYPE
+    return dtypes
+
+def apply_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """
+    Function to convert the columns of a DataFrame to their schema dtypes
+
+    Args:
+        df (pd.DataFrame): The data to convert
+        dtypes (Dict[str, str]): The dtype of each column
+
+    Returns:
+        pd.DataFrame: The converted data
+    """
+    df = df.copy(deep=False)
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            df[col] = pd.Series([None] * len(df), index=df.index, dtype=object)
+
+        if dtype == "datetime64[ns]":
+            # python datetimes would keep a microsecond unit, the loan indexes compare nanoseconds
+            df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601").astype("datetime64[ns]")
+        elif dtype == "bool":
+            if df[col].dtype != bool:
+                df[col] = df[col].astype(str).str.lower().isin(["true", "1", "1.0"])
+        elif dtype == "int64":
+            # a missing key would silently turn the column into floats, keep it nullable instead
+            column = pd.to_numeric(df[col]).astype("Int64")
+            df[col] = column if column.hasnans else column.astype("int64")
+        elif dtype == "Int64":
+            df[col] = pd.to_numeric(df[col]).astype("Int64")
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def memory_usage(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to report the memory used by each column of a DataFrame
+
+    Args:
+        df (pd.DataFrame): The data to inspect
+
+    Returns:
+        pd.DataFrame: The dtype and the bytes used by each column, plus the index and a total row
+    """
+    usage = df.memory_usage(deep=True)
+    report = pd.DataFrame({
+        "dtype": [str(df.index.dtype)] + [str(df[col].dtype) for col in df.columns],
+        "bytes": usage.values,
+    }, index=usage.index)
+    report.loc["Total"] = ["", int(usage.sum())]
+    return report
@@ -0,0 +1,202 @@
+from typing import Dict, List, Type, Union
+import glob
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, ValidationError
+
+from services.schema import apply_dtypes
+
+# 64 bit golden ratio multiplier, spreads sequential and check digit heavy keys (isbns) evenly over the shards
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def shard_of(keys: Union[int, pd.Series, np.ndarray], shards: int) -> Union[int, np.ndarray]:
+    """
+    Function to get the shard of one or many primary keys
+
+    Args:
+        keys (Union[int, pd.Series, np.ndarray]): The primary key(s)
+        shards (int): The number of shards
+
+    Returns:
+        Union[int, np.ndarray]: The shard of each key
+    """
+    hashed = np.asarray(keys, dtype="int64").view("uint64") * _HASH_MULTIPLIER >> np.uint64(32)
+    shard = hashed % np.uint64(shards)
+    return int(shard) if np.ndim(shard) == 0 else shard.astype("int64")
+
+def shard_paths(file_path: str, shards: int) -> List[str]:
+    """
+    Function to get the file of every shard of a table
+
+    Args:
+        file_path (str): The path of the unsharded table file
+        shards (int): The number of shards
+
+    Returns:
+        List[str]: The path of each shard, the table file itself when it is not sharded
+    """
+    if shards <= 1:
+        return [file_path]
+    stem, ext = os.path.splitext(file_path)
+    return [f"{stem}.{i}{ext}" for i in range(shards)]
+
+def existing_paths(file_path: str) -> List[str]:
+    """
+    Function to find every file currently holding rows of a table, whatever layout it was written with
+
+    Args:
+        file_path (str): The path of the unsharded table file
+
+    Returns:
+        List[str]: The table file and shard files that exist
+    """
+    stem, ext = os.path.splitext(file_path)
+    pattern = re.compile(re.escape(stem) + r"\.\d+" + re.escape(ext) + "$")
+    paths = [p for p in glob.glob(f"{glob.escape(stem)}.*{ext}") if pattern.match(p)]
+    return ([file_path] if os.path.exists(file_path) else []) + sorted(paths)
+
+def layout_path(file_path: str) -> str:
+    """
+    Function to get the file recording the shard layout of a table, stored beside the table file
+
+    Args:
+        file_path (str): The path of the unsharded table file
+
+    Returns:
+        str: The path of the layout file
+    """
+    return f"{os.path.splitext(file_path)[0]}.layout.json"
+
+def read_layout(file_path: str) -> Union[int, None]:
+    """
+    Function to read the number of shards a table was last written with
+
+    Args:
+        file_path (str): The path of the unsharded table file
+
+    Returns:
+        Union[int, None]: The number of shards, None if the layout was never recorded
+    """
+    path = layout_path(file_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return int(json.load(f)["shards"])
+
+def write_layout(file_path: str, shards: int) -> None:
+    """
+    Function to record the number of shards of a table, it overrides the configured number of shards
+
+    Args:
+        file_path (str): The path of the unsharded table file
+        shards (int): The number of shards
+
+    Returns:
+        None
+    """
+    path = layout_path(file_path)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"shards": shards}, f)
+    os.replace(f"{path}.tmp", path)
+
+def write_csv(df: pd.DataFrame, path: str) -> None:
+    """
+    Function to replace a table or shard file atomically. Readers and backups that opened or linked
+    the old file keep a complete copy of it instead of seeing a half written one.
+
+    Args:
+        df (pd.DataFrame): The data to be written
+        path (str): The path of the file
+
+    Returns:
+        None
+    """
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def read_shard(path: str, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """
+    Function to read one shard with the schema dtypes, run in a worker process
+
+    Args:
+        path (str): The path of the shard
+        dtypes (Dict[str, str]): The schema dtypes of the table
+
+    Returns:
+        pd.DataFrame: The rows of the shard
+    """
+    df = pd.read_csv(path) if os.path.exists(path) else pd.DataFrame(columns=list(dtypes))
+    return apply_dtypes(df, dtypes)
+
+def validate_shard(path: str, dtypes: Dict[str, str], model: Type[BaseModel], key_col: str) -> pd.DataFrame:
+    """
+    Function to validate every row of a shard against its pydantic model, run in a worker process
+
+    Args:
+        path (str): The path of the shard
+        dtypes (Dict[str, str]): The schema dtypes of the table
+        model (Type[BaseModel]): The pydantic model of a row
+        key_col (str): The primary key column
+
+    Returns:
+        pd.DataFrame: The shard, key and error of every invalid row
+    """
+    df = read_shard(path, dtypes)
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+    errors = []
+    for record in records:
+        try:
+            model(**record)
+        except ValidationError as e:
+            errors.append({"shard": path, key_col: record.get(key_col), "error": str(e.errors()[0]["msg"])})
+
+    # duplicate primary keys are invalid even if every row is
+    for key in df.loc[df[key_col].duplicated(), key_col]:
+        errors.append({"shard": path, key_col: key, "error": "Duplicate primary key"})
+    return pd.DataFrame(errors, columns=["shard", key_col, "error"])
+
+def summarize_shard(path: str, dtypes: Dict[str, str], group_col: Union[str, None] = None) -> pd.DataFrame:
+    """
+    Function to compute the row count and numeric totals of a shard, run in a worker process
+
+    Args:
+        path (str): The path of the shard
+        dtypes (Dict[str, str]): The schema dtypes of the table
+        group_col (Union[str, None], optional): The column to group the totals by. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The partial totals, to be summed across shards
+    """
+    df = read_shard(path, dtypes)
+    numeric = [col for col, dtype in dtypes.items() if dtype in ("Int64", "bool", "boolean") and col != group_col]
+    df = df.assign(rows=1)
+    if group_col is None:
+        return df[["rows"] + numeric].sum().to_frame().T
+    return df.groupby(group_col, observed=True)[["rows"] + numeric].sum()
+
+def merge_shard(path: str, dtypes: Dict[str, str], key_col: str, rows: pd.DataFrame) -> int:
+    """
+    Function to upsert rows into one shard, run in a worker process
+
+    Args:
+        path (str): The path of the shard
+        dtypes (Dict[str, str]): The schema dtypes of the table
+        key_col (str): The primary key column
+        rows (pd.DataFrame): The rows that belong to this shard
+
+    Returns:
+        int: The number of rows in the shard after the merge
+    """
+    df = read_shard(path, dtypes)
+    rows = apply_dtypes(rows, dtypes)
+    if not rows.empty:
+        df = rows if df.empty else pd.concat([df, rows], ignore_index=True)
+    df = df.drop_duplicates(subset=[key_col], keep="last")
+    write_csv(df, path)
+    return len(df)
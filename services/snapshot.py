@@ -0,0 +1,162 @@
+from typing import Dict, Tuple
+import bisect
+import os
+
+import numpy as np
+import pandas as pd
+
+from services.schema import apply_dtypes
+from config.log import db_logger
+
+# sentinel stored for missing integers, the same bit pattern numpy uses for NaT
+INT_NULL = np.iinfo("int64").min
+
+def _record_dtype(df: pd.DataFrame, dtypes: Dict[str, str]) -> np.dtype:
+    """
+    Function to build the fixed width record layout of a table
+
+    Args:
+        df (pd.DataFrame): The data to be written
+        dtypes (Dict[str, str]): The schema dtypes of the table
+
+    Returns:
+        np.dtype: The structured dtype with one fixed width field per column
+    """
+    fields = []
+    for col, dtype in dtypes.items():
+        if dtype in ("bool", "boolean"):
+            fields.append((col, "?"))
+        elif dtype in ("int64", "Int64", "datetime64[ns]"):
+            fields.append((col, "<i8"))
+        else:
+            width = int(df[col].dropna().astype(str).str.encode("utf-8").str.len().max()) if df[col].notna().any() else 0
+            fields.append((col, f"S{max(width, 1)}"))
+    return np.dtype(fields)
+
+def write_snapshot(df: pd.DataFrame, file_path: str, key_col: str, dtypes: Dict[str, str]) -> None:
+    """
+    Function to write a table as a fixed width record file sorted on its key.
+    The file is replaced atomically so readers that mapped the old file keep a valid view.
+
+    Args:
+        df (pd.DataFrame): The data to be written
+        file_path (str): The path of the snapshot file
+        key_col (str): The key the records are sorted on
+        dtypes (Dict[str, str]): The schema dtypes of the table
+
+    Returns:
+        None
+    """
+    df = df.sort_values(key_col, kind="stable").reset_index(drop=True)
+    records = np.zeros(len(df), dtype=_record_dtype(df, dtypes))
+
+    for col, dtype in dtypes.items():
+        if dtype in ("bool", "boolean"):
+            records[col] = df[col].fillna(False).astype(bool).to_numpy()
+        elif dtype == "datetime64[ns]":
+            records[col] = pd.to_datetime(df[col]).to_numpy().astype("int64")
+        elif dtype in ("int64", "Int64"):
+            records[col] = pd.array(df[col], dtype="Int64").fillna(INT_NULL).to_numpy(dtype="int64")
+        else:
+            records[col] = df[col].astype(object).where(df[col].notna(), "").astype(str).str.encode("utf-8").to_numpy()
+
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, records)
+    os.replace(tmp_path, file_path)
+
+class Snapshot():
+    """
+    Read only view of a table snapshot mapped into memory. Processes on the same host share
+    the page cache copy of the file and a key lookup only touches the pages it bisects through.
+    """
+    def __init__(self, file_path: str, key_col: str, dtypes: Dict[str, str]) -> None:
+        self.file_path = file_path
+        self.key_col = key_col
+        self.dtypes = dtypes
+        self.logger = db_logger.getChild("Snapshot")
+        self._signature: Tuple[int, int] = (0, 0)
+        self._records = None
+        self._frame = None
+
+    def _refresh(self) -> np.ndarray:
+        """
+        Function to map the snapshot file, mapping it again if it was replaced
+
+        Args:
+            None
+
+        Returns:
+            np.ndarray: The memory mapped records
+        """
+        stat = os.stat(self.file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            self._records = np.load(self.file_path, mmap_mode="r")
+            self._frame = None
+            self._signature = signature
+        return self._records
+
+    def _to_frame(self, records: np.ndarray) -> pd.DataFrame:
+        """
+        Function to decode records into a DataFrame with the schema dtypes
+
+        Args:
+            records (np.ndarray): The records to decode
+
+        Returns:
+            pd.DataFrame: The decoded data
+        """
+        data = {}
+        for col, dtype in self.dtypes.items():
+            values = np.asarray(records[col])
+            if dtype == "datetime64[ns]":
+                data[col] = values.view("datetime64[ns]")
+            elif dtype in ("int64", "Int64"):
+                data[col] = pd.array(values, dtype="Int64")
+                data[col][values == INT_NULL] = pd.NA
+            elif dtype in ("bool", "boolean"):
+                data[col] = values
+            else:
+                data[col] = pd.Series(np.char.decode(values, "utf-8"), dtype=object).replace("", None)
+        return apply_dtypes(pd.DataFrame(data, columns=list(self.dtypes)), self.dtypes)
+
+    def search(self, val: int) -> pd.DataFrame:
+        """
+        Function to find the records with the given key by bisecting the mapped key column
+
+        Args:
+            val (int): The key to search for
+
+        Returns:
+            pd.DataFrame: The records that were found
+        """
+        try:
+            records = self._refresh()
+            # np.searchsorted would first copy the strided key column, bisect only reads the probed records
+            keys = records[self.key_col]
+            lo = bisect.bisect_left(keys, val)
+            hi = bisect.bisect_right(keys, val, lo=lo)
+            return self._to_frame(records[lo:hi])
+        except Exception as e:
+            self.logger.error(f"Error searching snapshot {self.file_path}: {e}")
+            raise e
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Function to decode the whole snapshot, used for scans on non key columns
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame: The data in the snapshot
+        """
+        try:
+            records = self._refresh()
+            if self._frame is None:
+                self._frame = self._to_frame(records)
+            return self._frame
+        except Exception as e:
+            self.logger.error(f"Error loading snapshot {self.file_path}: {e}")
+            raise e
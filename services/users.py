@@ -1,20 +1,21 @@
 from typing import Union
-import os
 
 import pandas as pd
 
 from services.db import DB
+from services.context import StorageContext, default_context
+from services.schema import schema_dtypes
 from models.user import AddUser, DeleteUser, User
 
-from config.config import USERS_STORAGE_FILE_PATH, USERS_STORAGE_FILE_NAME
 from config.log import db_logger
 
 class UsersDB(DB):
-    def __init__(self, file_path = os.path.join(USERS_STORAGE_FILE_PATH, f"{USERS_STORAGE_FILE_NAME}")):
-        self.file_path = file_path
+    def __init__(self, file_path: Union[str, None] = None, context: Union[StorageContext, None] = None):
+        context = context or default_context()
+        self.file_path = file_path or context.users_file_path
         self.logger = db_logger.getChild("UsersDB")
         self.columns = list(User.model_fields.keys())
-        super().__init__(columns=self.columns)
+        super().__init__(columns=self.columns, dtypes=schema_dtypes(User, keys=["user_id"]), key_col="user_id", shards=context.users_shards, context=context)
 
     def check_user_id(self, user_id: int) -> bool:
         """
@@ -46,19 +47,20 @@ class UsersDB(DB):
             None
         """
         try:
-            user = User(**self._search(file_path=self.file_path, key="user_id", val=user_id).to_dict(orient="records")[0])
+            with self.context.locked(self.file_path):
+                user = self._record(model=User, key=user_id)
             
-            # Check if the user is already checked out
-            if user.is_checked_out == status:
-                self.logger.warning("User is already checked out.")
-                return
+                # Check if the user is already checked out
+                if user.is_checked_out == status:
+                    self.logger.warning("User is already checked out.")
+                    return
             
-            # Update the checkout status of the user
-            user.is_checked_out = status
+                # Update the checkout status of the user
+                user.is_checked_out = status
 
-            # Update the user in the storage
-            self._update(file_path=self.file_path, key_col="user_id", data=user)
-            self.logger.info("User checkout status updated.")
+                # Update the user in the storage
+                self._update(file_path=self.file_path, key_col="user_id", data=user)
+                self.logger.info("User checkout status updated.")
         except Exception as e:
             self.logger.error(f"Error updating user checkout status: {e}")
             raise e
@@ -74,7 +76,7 @@ class UsersDB(DB):
             None
         """
         try:
-            user = AddUser(**self._ask_for_input(AddUser.model_fields))
+            user = AddUser(**self._ask_for_input(AddUser))
             
             # Check if the user_id already exists
             if self.check_user_id(user_id=user.user_id):
@@ -99,7 +101,7 @@ class UsersDB(DB):
             None
         """
         try:
-            user = DeleteUser(**self._ask_for_input(DeleteUser.model_fields))
+            user = DeleteUser(**self._ask_for_input(DeleteUser))
 
             # Check if the user_id exists in the storage
             if not self.check_user_id(user_id=user.user_id):
@@ -129,7 +131,7 @@ class UsersDB(DB):
             None
         """
         try:
-            user = User(**self._ask_for_input(User.model_fields))
+            user = User(**self._ask_for_input(User))
             
             # Check if the user_id exists in the storage
             if not self.check_user_id(user_id=user.user_id):
@@ -155,7 +157,7 @@ class UsersDB(DB):
             Union[None, pd.DataFrame]: The search results if print_output is False
         """
         try:
-            user = User(**self._ask_for_input(User.model_fields))
+            user = User(**self._ask_for_input(User))
 
             # search the user in the storage based on the input if it exists based on user_id or name
             if user.user_id:
@@ -187,4 +189,40 @@ class UsersDB(DB):
             print(self._list(file_path=self.file_path))
         except Exception as e:
             self.logger.error(f"Error listing users in storage: {e}")
+            raise e
+
+    def validate_users(self, print_output: bool = True) -> Union[None, pd.DataFrame]:
+        """
+        Function to validate every user in the storage, one worker process per shard
+
+        Args:
+            print_output (bool): Whether to print the output or not
+
+        Returns:
+            Union[None, pd.DataFrame]: The invalid users if print_output is False
+        """
+        try:
+            errors = self._validate(file_path=self.file_path, model=AddUser)
+            if not print_output:
+                return errors
+            print(errors)
+        except Exception as e:
+            self.logger.error(f"Error validating users in storage: {e}")
+            raise e
+
+    def import_users(self) -> None:
+        """
+        Function to import users from a CSV file, replacing the users with the same user_id
+
+        Args:
+            Takes input from the user
+
+        Returns:
+            None
+        """
+        try:
+            total = self._import(file_path=self.file_path, source_path=input("Enter path of the CSV file to import: "))
+            self.logger.info(f"Users imported, {total} users in storage.")
+        except Exception as e:
+            self.logger.error(f"Error importing users into storage: {e}")
             raise e
\ No newline at end of file